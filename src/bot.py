@@ -3,17 +3,49 @@
 
 import os
 import sys
+import time
 import logging
+import builtins
+import importlib
 
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
 
-import modules
-
 log = logging.getLogger("main")
 
 
+# Módulos activos por defecto, se pueden cambiar con BOT_EXTENSIONS
+# Disponibles: help, welcome, polls, search, newMembers, info, mentorships,
+# reminders (to fix), events, scheduler, admin
+DEFAULT_EXTENSIONS = "help,welcome,polls,newMembers,info,mentorships,admin"
+
+
+class Matebot(commands.Bot):
+    """ Bot que espera a que los módulos guarden su estado antes de cerrar
+
+    Los cogs con un método `async def shutdown(self)` lo ejecutan al cerrar
+    el bot. `cog_unload` es sincrónico y lo que agenda ahí se cancela al
+    cerrar el event loop, así que no alcanza para escribir lo pendiente.
+    """
+
+    async def close(self):
+        for name, cog in list(self.cogs.items()):
+            shutdown = getattr(cog, "shutdown", None)
+            if shutdown is None:
+                continue
+            try:
+                await shutdown()
+            except Exception as e:
+                log.error("Error shutting down %s: %s", name, e)
+        await super().close()
+
+
+def get_extensions() -> list:
+    extensions = os.getenv("BOT_EXTENSIONS") or DEFAULT_EXTENSIONS
+    return [f"modules.{name.strip()}" for name in extensions.split(",") if name.strip()]
+
+
 def config_log():
     logging.basicConfig(
         format="%(asctime)-30s %(name)-20s %(levelname)-10s %(message)s",
@@ -21,10 +53,47 @@ def config_log():
     )
 
 
+def import_profile(extensions, top: int = 25):
+    """ Importo los módulos activos y muestro cuánto tarda cada import
+
+    Los tiempos incluyen los imports anidados. Para ver también lo que se
+    importa antes (discord, dotenv) usar `python -X importtime bot.py`.
+    """
+
+    timings = {}
+    original_import = builtins.__import__
+
+    def timed_import(name, *args, **kwargs):
+        if name in sys.modules:
+            return original_import(name, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return original_import(name, *args, **kwargs)
+        finally:
+            timings.setdefault(name, time.perf_counter() - started)
+
+    builtins.__import__ = timed_import
+    try:
+        for extension in extensions:
+            started = time.perf_counter()
+            importlib.import_module(extension)
+            timings[extension] = time.perf_counter() - started
+    finally:
+        builtins.__import__ = original_import
+
+    print(f"{'module':<40} {'ms':>10}")
+    for name, elapsed in sorted(timings.items(), key=lambda t: t[1], reverse=True)[:top]:
+        print(f"{name:<40} {elapsed * 1e3:>10.1f}")
+
+
 if __name__ == "__main__":
     load_dotenv()
     config_log()
 
+    if "--import-profile" in sys.argv:
+        import_profile(get_extensions())
+        sys.exit(0)
+
     intents = discord.Intents.default()
     intents.members = True
 
@@ -36,24 +105,16 @@ if __name__ == "__main__":
         log.info("Token not found ...")
         sys.exit(0)
 
-    bot = commands.Bot(
+    bot = Matebot(
         command_prefix=commands.when_mentioned_or(PREFIX),
         description="Matebot",
         help_command=None,
         intents=intents
     )
 
-    # Lista de módulos activa
-    bot.add_cog(modules.Help(bot))
-    bot.add_cog(modules.Welcome(bot))
-    bot.add_cog(modules.Polls(bot))
-    # bot.add_cog(modules.Search(bot))
-    bot.add_cog(modules.NewMembers(bot))
-    bot.add_cog(modules.Info(bot))
-    bot.add_cog(modules.Mentorship(bot))
-    # bot.add_cog(modules.Reminders(bot)) # To fix
-    # bot.add_cog(modules.Events(bot))
-    # bot.add_cog(modules.Scheduler(bot))
+    # Cada módulo es una extension con su `setup`, se importan recién acá
+    for extension in get_extensions():
+        bot.load_extension(extension)
 
     log.info("Bot started ...")
     bot.run(TOKEN)
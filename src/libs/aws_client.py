@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import random
+import asyncio
+import logging
+
+import aiohttp
+
+log = logging.getLogger(__name__)
+
+_shared_client = None
+
+
+class AwsUnavailable(Exception):
+    """El backend no respondió o el circuit breaker está abierto"""
+
+
+class CircuitBreaker:
+    """ Circuit breaker simple
+
+    Después de `threshold` fallas seguidas se abre durante `cooldown`
+    segundos y todas las llamadas fallan sin ir a la red. Pasado ese tiempo
+    deja pasar una llamada de prueba: si sale bien se cierra y si falla se
+    vuelve a abrir.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def is_open(self) -> bool:
+        if self.opened_at is None:
+            return False
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            # Half-open: la próxima llamada decide
+            return False
+        return True
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            if self.opened_at is None:
+                log.warning("AWS circuit breaker opened after %s failures", self.failures)
+            self.opened_at = time.monotonic()
+
+
+class AwsClient:
+    """ Cliente HTTP asíncrono para el backend de AWS
+
+    Usa una única `aiohttp.ClientSession`, así las conexiones keep-alive se
+    reutilizan entre requests y nunca se bloquea el event loop.
+
+    Los errores de conexión y los 429 se reintentan siempre con backoff
+    exponencial y jitter, porque el backend no llegó a procesar el request.
+    Los timeouts y los 5xx solo se reintentan si el request es idempotente,
+    para no registrar dos veces el mismo warning.
+
+    aws = get_aws_client()
+    response = await aws.post("/matebot/warning", json={...})
+    """
+
+    def __init__(self, url: str, api_key: str, timeout: float = 10,
+                 retries: int = 3, pool_size: int = 10, breaker: CircuitBreaker = None):
+        self.url = url
+        self.headers = {'x-api-key': api_key}
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self.pool_size = pool_size
+        self.breaker = breaker or CircuitBreaker()
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # La sesión se crea dentro del event loop que la va a usar
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers=self.headers,
+                timeout=self.timeout,
+                connector=aiohttp.TCPConnector(limit=self.pool_size)
+            )
+        return self._session
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        return min(2 ** attempt, 10) * random.uniform(0.5, 1.5)
+
+    async def request(self, method: str, path: str, idempotent: bool = False, **kwargs) -> dict:
+        """ Hace un request al backend y devuelve el json de la respuesta
+
+        Lanza `AwsUnavailable` si el circuit breaker está abierto, si el
+        backend respondió con un 5xx o si se agotaron los reintentos.
+        """
+
+        if self.breaker.is_open:
+            raise AwsUnavailable("AWS backend unavailable (circuit open)")
+
+        session = self._get_session()
+        for attempt in range(self.retries + 1):
+            retry = False
+            try:
+                async with session.request(method, f'{self.url}{path}', **kwargs) as response:
+                    if response.status == 429 or response.status >= 500:
+                        # Un 5xx cuenta como falla del backend aunque no se reintente
+                        retry = response.status == 429 or idempotent
+                        error = f"HTTP {response.status}"
+                    else:
+                        # El backend responde con un `code` propio también en los errores
+                        data = await response.json(content_type=None)
+                        self.breaker.success()
+                        return data
+            except aiohttp.ClientConnectionError as e:
+                # No se pudo conectar: el request no llegó al backend
+                retry = isinstance(e, aiohttp.ClientConnectorError) or idempotent
+                error = e
+            except asyncio.TimeoutError:
+                retry = idempotent
+                error = "timeout"
+
+            self.breaker.failure()
+            if not retry or attempt == self.retries or self.breaker.is_open:
+                break
+            backoff = self._backoff(attempt)
+            log.warning("AWS %s %s failed (%s), retrying in %.1fs", method, path, error, backoff)
+            await asyncio.sleep(backoff)
+
+        raise AwsUnavailable(f"AWS {method} {path} failed: {error}")
+
+    async def get(self, path: str, **kwargs) -> dict:
+        return await self.request("GET", path, idempotent=True, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> dict:
+        return await self.request("POST", path, **kwargs)
+
+    async def patch(self, path: str, **kwargs) -> dict:
+        return await self.request("PATCH", path, **kwargs)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+def get_aws_client() -> AwsClient:
+    """ Devuelve la instancia de AwsClient compartida por todo el proceso
+
+    Se configura con las variables de entorno:
+
+    AWS_URL: url base del backend
+    AWS_API_KEY: api key
+    AWS_TIMEOUT: timeout total de cada request en segundos (default 10)
+    AWS_RETRIES: cantidad de reintentos (default 3)
+    """
+
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = AwsClient(
+            os.getenv("AWS_URL"),
+            os.getenv("AWS_API_KEY"),
+            timeout=float(os.getenv("AWS_TIMEOUT", "10")),
+            retries=int(os.getenv("AWS_RETRIES", "3"))
+        )
+    return _shared_client
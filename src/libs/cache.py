@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import time
+from collections import OrderedDict
+
+# Valor que devuelve `get` cuando la clave no está, así se puede cachear None
+MISSING = object()
+
+
+class TTLCache:
+    """ Cache en memoria con vencimiento y límite de tamaño
+
+    Cada entrada vence a los `ttl` segundos. Si se supera `maxsize` se
+    descarta la entrada usada hace más tiempo (LRU).
+
+    cache = TTLCache(ttl=60, maxsize=1000)
+    cache.set("key", value)
+    value = cache.get("key")  # MISSING si no está o venció
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+        # Métricas
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        return self.get(key) is not MISSING
+
+    def get(self, key, default=MISSING):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, expires = entry
+        if expires <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl: float = None):
+        """Guarda un valor, `ttl` reemplaza al vencimiento por defecto"""
+
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (value, expires)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
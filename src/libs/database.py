@@ -1,7 +1,11 @@
 # -*- coding: utf-8 -*-
 
+import os
+import asyncio
 import logging
 import functools
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from faunadb import query as q
 from faunadb.client import FaunaClient
 
@@ -20,6 +24,25 @@ def log_debug(func):
     return wrapper
 
 
+def parse_fauna_time(value) -> datetime:
+    """ Convierto un FaunaTime (o su valor ISO 8601) a datetime con zona UTC
+
+    Fauna puede devolver hasta 9 decimales en los segundos y datetime acepta
+    6, así que se recortan antes de parsear.
+
+    parse_fauna_time(doc["data"]["time"])
+    """
+
+    value = getattr(value, "value", value)
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    if "." in value:
+        seconds, offset = value.split(".", 1)
+        digits = len(offset) - len(offset.lstrip("0123456789"))
+        value = f"{seconds}.{offset[:min(digits, 6)].ljust(6, '0')}{offset[digits:]}"
+    return datetime.fromisoformat(value)
+
+
 class Database:
     """ Clase utilizada para definir querys
 
@@ -27,9 +50,14 @@ class Database:
     doc["ref"].id()
     """
 
-    def __init__(self, secret: str):
+    def __init__(self, secret: str, pool_size: int = 10, timeout: int = 60):
         self.q = q
-        self.client = FaunaClient(secret=secret)
+        self.client = FaunaClient(
+            secret=secret,
+            timeout=timeout,
+            pool_connections=pool_size,
+            pool_maxsize=pool_size
+        )
 
     def create(self, collection: str, data) -> dict:
         """ Creo un documento en una colección existente
@@ -91,20 +119,23 @@ class Database:
             )
         )
 
-    def get_all(self, index: str):
+    def get_all(self, index: str, size: int = 500, after=None):
         """ Obtiene todos los documentos que hacen match con el index
 
+        Devuelve una página de `size` documentos, si hay más páginas
+        `page["after"]` es el cursor de la siguiente (ver `AsyncDatabase.iter_all`)
+
         get_all("my_index")
         """
 
         return self.client.query(
             q.map_(
                 lambda ref: q.get(ref),
-                q.paginate(q.match(q.index(index)), size=500)
+                q.paginate(q.match(q.index(index)), size=size, after=after)
             )
         )
 
-    def get_all_by_time(self, index: str):
+    def get_all_by_time(self, index: str, size: int = None, after=None):
         """ Obtiene todos los documentos que hacen match con el index
 
         get_all("my_index")
@@ -113,21 +144,21 @@ class Database:
         return self.client.query(
             q.map_(
                 lambda _, ref: q.get(ref),
-                q.paginate(q.match(q.index(index)))
+                q.paginate(q.match(q.index(index)), size=size, after=after)
             )
         )
 
-    def get_by_author(self, index: str, author: str):
+    def get_by_author(self, index: str, author: str, size: int = None, after=None):
         """Obtengo todos los documentos de un author en particular"""
 
         return self.client.query(
             q.map_(
                 lambda ref: q.get(ref),
-                q.paginate(q.match(q.index(index), author))
+                q.paginate(q.match(q.index(index), author), size=size, after=after)
             )
         )
 
-    def get_by_expired_time(self, index: str):
+    def get_by_expired_time(self, index: str, size: int = None, after=None):
         """ Obtengo todos los documentos con fechas anteriores a la actual
 
         get_by_expired_time("my_index")
@@ -140,7 +171,9 @@ class Database:
                     q.range(
                         q.match(q.index(index)), q.time(
                             "2020-01-01T00:00:00Z"), q.now()
-                    )
+                    ),
+                    size=size,
+                    after=after
                 )
             )
         )
@@ -205,6 +238,19 @@ class Database:
             )
         )
 
+    def delete_many(self, collection: str, ids: list):
+        """ Elimino varios documentos por id en una única query
+
+        delete_many("my_collection", [1234567890, 1234567891])
+        """
+
+        return self.client.query(
+            q.foreach(
+                lambda id_: q.delete(q.ref(q.collection(collection), id_)),
+                list(ids)
+            )
+        )
+
     def delete_by_expired_time(self, index: str):
         """ Elimino todos los documentos que caducaron
 
@@ -262,6 +308,58 @@ class Database:
         )
         return poll
 
+    def get_active_poll_ids(self, size: int = 10000, after=None):
+        '''
+        Descripción: Obtengo una página con los ids de discord de las encuestas activas
+        '''
+
+        return self.client.query(
+            q.paginate(
+                q.match(q.index("active_polls"), True),
+                size=size,
+                after=after
+            )
+        )
+
+    def get_poll_deadlines(self, size: int = 10000, after=None):
+        '''
+        Descripción: Obtengo una página con [closes_at, id, channel_id] de las encuestas activas
+        '''
+
+        return self.client.query(
+            q.paginate(
+                q.match(q.index("active_polls_by_deadline"), True),
+                size=size,
+                after=after
+            )
+        )
+
+    def close_poll(self, ref, snapshot: dict):
+        """ Cierro una encuesta y guardo el resultado final
+
+        El resultado se guarda como un documento nuevo en `PollResults` que no
+        se vuelve a modificar, y la encuesta queda inactiva apuntando a él.
+        Todo ocurre en una única transacción. Si la encuesta ya estaba cerrada
+        no se escribe nada y se devuelve None.
+        """
+
+        return self.client.query(
+            q.if_(
+                q.select(["data", "is_active"], q.get(ref)),
+                q.let(
+                    {"result": q.create(
+                        q.collection("PollResults"),
+                        {"data": q.merge(snapshot, {"closed_at": q.now()})}
+                    )},
+                    q.update(ref, {"data": {
+                        "is_active": False,
+                        "result": q.select(["ref"], q.var("result"))
+                    }})
+                ),
+                None
+            )
+        )
+
     def update_with_ref(self, ref, data):
         """Actualiza datos
 
@@ -278,6 +376,79 @@ class Database:
             )
         )
 
+    def apply_poll_votes(self, ref, poll_id: int, votes: dict, adds: list, removes: list):
+        """ Aplica los votos acumulados de una encuesta
+
+        Los votos se suman sobre los valores guardados dentro de la misma
+        query, así no se pisan escrituras concurrentes. Cada voto se guarda
+        como un documento chico en `PollVotes`, así la escritura no depende
+        de la cantidad de personas que ya votaron.
+
+        apply_poll_votes(
+            poll["ref"], 1234, {"A": 1, "B": -1},
+            adds=[(5678, "A", 1, 1650000000000000000)],  # (user_id, option, weight, seq)
+            removes=[(9012, "B")]                        # (user_id, option)
+        )
+        """
+
+        return self.client.query(
+            q.do(
+                q.let(
+                    {"poll": q.get(ref)},
+                    q.update(ref, {"data": {
+                        "votes_count": {
+                            option: q.add(
+                                q.select(["data", "votes_count", option], q.var("poll")), count)
+                            for option, count in votes.items()
+                        }
+                    }})
+                ),
+                q.foreach(
+                    lambda user_id, option: q.foreach(
+                        lambda vote: q.delete(vote),
+                        q.paginate(q.match(
+                            q.index("poll_vote_by_ballot"), [poll_id, user_id, option]))
+                    ),
+                    [list(remove) for remove in removes]
+                ),
+                q.foreach(
+                    lambda user_id, option, weight, seq: q.create(
+                        q.collection("PollVotes"),
+                        {"data": {
+                            "poll_id": poll_id,
+                            "user_id": user_id,
+                            "option": option,
+                            "weight": weight,
+                            "seq": seq
+                        }}
+                    ),
+                    [list(add) for add in adds]
+                )
+            )
+        )
+
+    def get_poll_ballots(self, poll_id: int, size: int = 10000) -> list:
+        """ Obtengo todos los votos de una encuesta
+
+        Recorre todas las páginas del index `poll_ballots_by_poll` y devuelve
+        una lista de [seq, user_id, option, weight].
+        """
+
+        ballots = []
+        after = None
+        while True:
+            page = self.client.query(
+                q.paginate(
+                    q.match(q.index("poll_ballots_by_poll"), poll_id),
+                    size=size,
+                    after=after
+                )
+            )
+            ballots.extend(page['data'])
+            after = page.get('after')
+            if after is None:
+                return ballots
+
     def get_mentee_by_discord_id(self, id):
         '''
         Descripción: Obtengo (si existe) un mentor penalizado con una id específica
@@ -307,3 +478,179 @@ class Database:
             )
         )
         return users
+
+
+class AsyncDatabase:
+    """ Versión asíncrona de Database
+
+    Expone los mismos métodos que `Database` pero como corrutinas. Cada query
+    se ejecuta en un pool de threads acotado, así el event loop de discord.py
+    sigue procesando eventos del gateway mientras la query está en vuelo.
+
+    doc = await db.get("my_collection", 1234567890)
+    """
+
+    def __init__(self, secret: str, pool_size: int = 10, timeout: int = 60):
+        self._db = Database(secret, pool_size=pool_size, timeout=timeout)
+        self.q = q
+        # Un thread por conexión del pool, así nunca hay más queries en
+        # vuelo que conexiones disponibles
+        self._executor = ThreadPoolExecutor(
+            max_workers=pool_size, thread_name_prefix="fauna")
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs))
+
+    async def create(self, collection: str, data) -> dict:
+        return await self._run(self._db.create, collection, data)
+
+    async def create_collection(self, name: str) -> bool:
+        return await self._run(self._db.create_collection, name)
+
+    async def create_index(self, collection: str, id: int, data: dict) -> bool:
+        return await self._run(self._db.create_index, collection, id, data)
+
+    async def get(self, collection: str, id_: str):
+        return await self._run(self._db.get, collection, id_)
+
+    async def get_all(self, index: str, size: int = 500, after=None):
+        return await self._run(self._db.get_all, index, size, after)
+
+    async def get_all_by_time(self, index: str, size: int = None, after=None):
+        return await self._run(self._db.get_all_by_time, index, size, after)
+
+    async def get_by_author(self, index: str, author: str, size: int = None, after=None):
+        return await self._run(self._db.get_by_author, index, author, size, after)
+
+    async def get_by_expired_time(self, index: str, size: int = None, after=None):
+        return await self._run(self._db.get_by_expired_time, index, size, after)
+
+    async def _iter_pages(self, func, *args, size: int, prefetch: bool):
+        """ Recorre todas las páginas de una query siguiendo el cursor `after`
+
+        Con `prefetch` la query de la página siguiente se lanza antes de
+        devolver los documentos de la actual, así la latencia de la red se
+        superpone con el procesamiento.
+        """
+
+        page = await self._run(func, *args, size, None)
+        next_page = None
+        try:
+            while True:
+                after = page.get('after')
+                if after is not None and prefetch:
+                    next_page = asyncio.ensure_future(self._run(func, *args, size, after))
+                for doc in page['data']:
+                    yield doc
+                if after is None:
+                    return
+                page = await next_page if prefetch else await self._run(func, *args, size, after)
+                next_page = None
+        finally:
+            # Si se deja de iterar antes de terminar no queda una query colgada
+            if next_page is not None:
+                next_page.cancel()
+
+    def iter_all(self, index: str, size: int = 500, prefetch: bool = True):
+        """ Itera todos los documentos que hacen match con el index
+
+        async for doc in db.iter_all("my_index"):
+            ...
+        """
+
+        return self._iter_pages(self._db.get_all, index, size=size, prefetch=prefetch)
+
+    def iter_all_by_time(self, index: str, size: int = 500, prefetch: bool = True):
+        return self._iter_pages(self._db.get_all_by_time, index, size=size, prefetch=prefetch)
+
+    def iter_by_author(self, index: str, author: str, size: int = 500, prefetch: bool = True):
+        return self._iter_pages(self._db.get_by_author, index, author, size=size, prefetch=prefetch)
+
+    def iter_by_expired_time(self, index: str, size: int = 500, prefetch: bool = True):
+        return self._iter_pages(self._db.get_by_expired_time, index, size=size, prefetch=prefetch)
+
+    async def update(self, collection: str, id_: str, data):
+        return await self._run(self._db.update, collection, id_, data)
+
+    async def update_all_jobs(self, collection: str, array_data):
+        return await self._run(self._db.update_all_jobs, collection, array_data)
+
+    async def replace(self, collection: str, id_: str, data):
+        return await self._run(self._db.replace, collection, id_, data)
+
+    async def delete(self, collection: str, id_: str):
+        return await self._run(self._db.delete, collection, id_)
+
+    async def delete_many(self, collection: str, ids: list):
+        return await self._run(self._db.delete_many, collection, ids)
+
+    async def delete_by_expired_time(self, index: str):
+        return await self._run(self._db.delete_by_expired_time, index)
+
+    async def delete_by_id_and_author(self, collection: str, index: str, id_: str, author: str):
+        return await self._run(self._db.delete_by_id_and_author, collection, index, id_, author)
+
+    async def get_poll_by_discord_id(self, id):
+        return await self._run(self._db.get_poll_by_discord_id, id)
+
+    async def get_active_poll_ids(self, size: int = 10000, after=None):
+        return await self._run(self._db.get_active_poll_ids, size, after)
+
+    async def get_poll_deadlines(self, size: int = 10000, after=None):
+        return await self._run(self._db.get_poll_deadlines, size, after)
+
+    def iter_active_poll_ids(self, size: int = 10000, prefetch: bool = True):
+        return self._iter_pages(self._db.get_active_poll_ids, size=size, prefetch=prefetch)
+
+    def iter_poll_deadlines(self, size: int = 10000, prefetch: bool = True):
+        return self._iter_pages(self._db.get_poll_deadlines, size=size, prefetch=prefetch)
+
+    async def close_poll(self, ref, snapshot: dict):
+        return await self._run(self._db.close_poll, ref, snapshot)
+
+    async def update_with_ref(self, ref, data):
+        return await self._run(self._db.update_with_ref, ref, data)
+
+    async def apply_poll_votes(self, ref, poll_id: int, votes: dict, adds: list, removes: list):
+        return await self._run(self._db.apply_poll_votes, ref, poll_id, votes, adds, removes)
+
+    async def get_poll_ballots(self, poll_id: int, size: int = 10000) -> list:
+        return await self._run(self._db.get_poll_ballots, poll_id, size)
+
+    async def get_mentee_by_discord_id(self, id):
+        return await self._run(self._db.get_mentee_by_discord_id, id)
+
+    async def get_all_warned_mentees(self):
+        return await self._run(self._db.get_all_warned_mentees)
+
+    def close(self):
+        """Libera los threads del pool"""
+
+        self._executor.shutdown(wait=False)
+
+
+_shared_database = None
+
+
+def get_database() -> AsyncDatabase:
+    """ Devuelve la instancia de AsyncDatabase compartida por todo el proceso
+
+    Todos los cogs usan el mismo FaunaClient y por lo tanto el mismo pool de
+    conexiones keep-alive. Se configura con las variables de entorno:
+
+    FAUNADB_SECRET_KEY: secret de la base de datos
+    FAUNADB_POOL_SIZE: cantidad de conexiones del pool (default 10)
+    FAUNADB_TIMEOUT: timeout de cada request en segundos (default 10)
+    """
+
+    global _shared_database
+    if _shared_database is None:
+        _shared_database = AsyncDatabase(
+            os.getenv("FAUNADB_SECRET_KEY"),
+            pool_size=int(os.getenv("FAUNADB_POOL_SIZE", "10")),
+            timeout=int(os.getenv("FAUNADB_TIMEOUT", "10"))
+        )
+        log.info("Fauna pool created")
+    return _shared_database
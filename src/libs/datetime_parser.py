@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Parser de fechas en lenguaje natural
+
+Reconoce los formatos que aceptan los comandos del bot, en español e inglés:
+
+    hoy a las 22:00 gmt-3
+    mañana 8pm utc
+    el 2030/12/24 a las 8pm gmt-3
+    le 24/12/2030 20:30 -03:00
+    el viernes a las 19hs gmt-3
+    en 2 horas gmt-3
+
+Las expresiones regulares se compilan una sola vez y el resultado del
+análisis de cada frase se guarda en un cache LRU. Como "hoy" o "en 2 horas"
+dependen del momento, lo que se cachea es la estructura de la frase y la
+fecha se resuelve en cada llamada. Si la frase no se reconoce se usa
+dateparser, que se importa recién la primera vez que hace falta.
+"""
+
+import re
+import logging
+import unicodedata
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+log = logging.getLogger(__name__)
+
+WEEKDAYS = {
+    "lunes": 0, "martes": 1, "miercoles": 2, "jueves": 3, "viernes": 4,
+    "sabado": 5, "domingo": 6,
+    "monday": 0, "tuesday": 1, "wednesday": 2, "thursday": 3, "friday": 4,
+    "saturday": 5, "sunday": 6,
+}
+
+RELATIVE_DAYS = {
+    "hoy": 0, "today": 0,
+    "manana": 1, "tomorrow": 1,
+    "pasado manana": 2,
+}
+
+UNITS = {
+    "min": "minutes", "mins": "minutes", "minuto": "minutes", "minutos": "minutes",
+    "minute": "minutes", "minutes": "minutes",
+    "h": "hours", "hora": "hours", "horas": "hours", "hour": "hours", "hours": "hours",
+    "dia": "days", "dias": "days", "day": "days", "days": "days",
+    "semana": "weeks", "semanas": "weeks", "week": "weeks", "weeks": "weeks",
+}
+
+# Palabras que no aportan información
+FILLERS = {"el", "la", "de", "del", "a", "las", "los", "at", "on", "the", "le", "proximo", "next"}
+
+_TZ = re.compile(
+    r"(?:\b(?:gmt|utc)\s*(?:(?P<sign>[+-])\s*(?P<hours>\d{1,2})(?::?(?P<minutes>\d{2}))?)?\b)"
+    r"|(?:(?<![\d:])(?P<osign>[+-])(?P<ohours>\d{2}):?(?P<ominutes>\d{2})\b)")
+_YMD = re.compile(r"\b(?P<y>\d{4})[/-](?P<m>\d{1,2})[/-](?P<d>\d{1,2})\b")
+_DMY = re.compile(r"\b(?P<d>\d{1,2})[/-](?P<m>\d{1,2})(?:[/-](?P<y>\d{2,4}))?\b")
+_RELATIVE_DAY = re.compile(r"\b(?P<day>pasado manana|hoy|today|manana|tomorrow)\b")
+_WEEKDAY = re.compile(r"\b(?P<day>" + "|".join(WEEKDAYS) + r")\b")
+_DELTA = re.compile(r"\b(?:en|in)\s+(?P<n>\d+)\s*(?P<unit>" + "|".join(
+    sorted(UNITS, key=len, reverse=True)) + r")\b")
+_TIME = re.compile(
+    r"\b(?P<h>\d{1,2})(?::(?P<m>\d{2}))?\s*(?P<ampm>am|pm|hs|h)?\b(?!\s*[/-]\d)")
+_WORD = re.compile(r"[^\W\d_]+|\d+|\S")
+
+# Estructura de una frase, la fecha final se calcula con `_resolve`
+Spec = namedtuple("Spec", "kind value time offset")
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c)).strip()
+
+
+def _take(pattern, text: str):
+    """Busco el patrón y lo quito del texto"""
+
+    match = pattern.search(text)
+    if match is None:
+        return None, text
+    return match, text[:match.start()] + " " + text[match.end():]
+
+
+@lru_cache(maxsize=1024)
+def parse_spec(text: str):
+    """ Analizo la frase y devuelvo su `Spec`, o None si no se reconoce
+
+    El resultado no depende del momento en que se llama, por eso se cachea.
+    """
+
+    text = _normalize(text)
+
+    offset = None
+    match, text = _take(_TZ, text)
+    if match is not None:
+        if match.group("osign"):
+            sign, hours, minutes = match.group("osign", "ohours", "ominutes")
+        else:
+            sign, hours, minutes = match.group("sign", "hours", "minutes")
+        delta = timedelta(hours=int(hours or 0), minutes=int(minutes or 0))
+        offset = -delta if sign == "-" else delta
+
+    kind, value = None, None
+    for pattern in (_DELTA, _YMD, _DMY, _RELATIVE_DAY, _WEEKDAY):
+        match, text = _take(pattern, text)
+        if match is None:
+            continue
+        if pattern is _DELTA:
+            kind, value = "delta", timedelta(**{UNITS[match.group("unit")]: int(match.group("n"))})
+        elif pattern is _RELATIVE_DAY:
+            kind, value = "days", RELATIVE_DAYS[match.group("day")]
+        elif pattern is _WEEKDAY:
+            kind, value = "weekday", WEEKDAYS[match.group("day")]
+        else:
+            year = match.group("y")
+            if year is not None and len(year) == 2:
+                year = "20" + year
+            kind = "date"
+            value = (int(year) if year else None, int(match.group("m")), int(match.group("d")))
+        break
+
+    time = None
+    if kind != "delta":
+        match, text = _take(_TIME, text)
+        if match is not None:
+            hour, minute = int(match.group("h")), int(match.group("m") or 0)
+            ampm = match.group("ampm")
+            if ampm == "pm" and hour < 12:
+                hour += 12
+            elif ampm == "am" and hour == 12:
+                hour = 0
+            if hour > 23 or minute > 59:
+                return None
+            time = (hour, minute)
+
+    # Si queda algo que no es relleno la frase no se reconoce
+    if kind is None and time is None:
+        return None
+    if any(word not in FILLERS for word in _WORD.findall(text)):
+        return None
+    return Spec(kind, value, time, offset)
+
+
+def _resolve(spec: Spec, now: datetime):
+    """Calculo la fecha de una `Spec` a partir de `now`"""
+
+    if spec.kind == "delta":
+        return now + spec.value
+
+    if spec.kind == "date":
+        year, month, day = spec.value
+        date = now.replace(year=year or now.year, month=month, day=day)
+        if year is None and date.date() < now.date():
+            date = date.replace(year=now.year + 1)
+        if spec.time is None:
+            return date.replace(hour=0, minute=0, second=0, microsecond=0)
+    elif spec.kind == "days":
+        date = now + timedelta(days=spec.value)
+    elif spec.kind == "weekday":
+        date = now + timedelta(days=(spec.value - now.weekday()) % 7)
+    else:
+        date = now
+
+    if spec.time is not None:
+        hour, minute = spec.time
+        date = date.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        # Un día de la semana que ya pasó hoy es el de la semana que viene
+        if spec.kind == "weekday" and date <= now:
+            date += timedelta(days=7)
+    return date
+
+
+def _fallback(text: str, languages=None):
+    # dateparser tarda en importarse, solo se carga si hace falta
+    import dateparser
+    return dateparser.parse(text, languages=languages)
+
+
+def parse(text: str, now: datetime = None, fallback: bool = True, languages=None):
+    """ Convierto una frase en datetime
+
+    Si la frase tiene zona horaria el resultado la incluye, si no es una
+    fecha sin zona en la hora local (igual que dateparser). Devuelve None si
+    no se pudo interpretar.
+
+    parse("mañana a las 22:00 gmt-3")
+    """
+
+    try:
+        spec = parse_spec(text)
+    except ValueError:
+        spec = None
+    if spec is None:
+        if not fallback:
+            return None
+        log.debug("Falling back to dateparser: %s", text)
+        return _fallback(text, languages)
+
+    if spec.offset is not None:
+        tz = timezone(spec.offset)
+        now = now.astimezone(tz) if now is not None else datetime.now(tz)
+    elif now is None:
+        now = datetime.now()
+
+    try:
+        return _resolve(spec, now)
+    except ValueError:
+        # Por ejemplo, 31/02
+        return None
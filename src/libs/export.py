@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import json
+import logging
+import tempfile
+
+log = logging.getLogger(__name__)
+
+
+def _default(obj):
+    # Ref, FaunaTime, etc. se serializan con sus atributos
+    return obj.__dict__
+
+
+async def export_ndjson(db, index: str, compress: bool = False, page_size: int = 500):
+    """ Exporta todos los documentos de un index en formato NDJSON
+
+    Recorre las páginas del index con `iter_all` y escribe un documento por
+    línea a medida que llegan, así la memoria usada depende del tamaño de
+    la página y no de la colección. El resultado queda en un archivo
+    temporal en disco posicionado al inicio, listo para subir.
+
+    Se usa `TemporaryFile` y no `SpooledTemporaryFile` porque este último
+    recién hereda de `io.IOBase` en Python 3.11, y en versiones anteriores
+    `discord.File` lo trata como una ruta.
+
+    Devuelve el archivo y la cantidad de documentos exportados.
+    """
+
+    tmp = tempfile.TemporaryFile()
+    out = gzip.GzipFile(fileobj=tmp, mode="wb") if compress else tmp
+    count = 0
+    try:
+        async for doc in db.iter_all(index, size=page_size):
+            line = json.dumps(doc, default=_default, sort_keys=True)
+            out.write(line.encode("utf-8") + b"\n")
+            count += 1
+        if compress:
+            out.close()
+    except Exception:
+        tmp.close()
+        raise
+
+    log.info("Exported %s documents from %s", count, index)
+    tmp.seek(0)
+    return tmp, count
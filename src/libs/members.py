@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import logging
+
+import discord
+from discord.ext.commands import MemberNotFound
+
+from libs.cache import TTLCache
+
+log = logging.getLogger(__name__)
+
+# query_members acepta hasta 100 ids por request
+MAX_BATCH = 100
+
+
+class MemberResolver:
+    """ Obtiene miembros de un server con la menor cantidad de requests
+
+    1. Con el intent de members casi siempre están en el cache del gateway
+       (`guild.get_member`), sin ir a la red.
+    2. Si no están, los pedidos que llegan dentro de `batch_window` segundos
+       se agrupan en un único `guild.query_members`, y varios pedidos del
+       mismo id comparten el mismo resultado.
+    3. Los ids que no son miembros se recuerdan `negative_ttl` segundos, así
+       no se vuelven a pedir.
+
+    members = MemberResolver()
+    member = await members.resolve(ctx.guild, user_id)
+    """
+
+    def __init__(self, batch_window: float = 0.05, negative_ttl: float = 300):
+        self.batch_window = batch_window
+        self.missing = TTLCache(ttl=negative_ttl, maxsize=4096)
+        self._pending = {}
+        self._batches = {}
+
+    async def resolve(self, guild: discord.Guild, user_id: int):
+        """Devuelve el miembro o None si no está en el server"""
+
+        user_id = int(user_id)
+        member = guild.get_member(user_id)
+        if member is not None:
+            return member
+        if (guild.id, user_id) in self.missing:
+            return None
+
+        future = self._pending.get((guild.id, user_id))
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[(guild.id, user_id)] = future
+            batch = self._batches.setdefault(guild.id, [])
+            batch.append(user_id)
+            if len(batch) == 1:
+                asyncio.get_running_loop().call_later(
+                    self.batch_window, self._flush, guild)
+        return await asyncio.shield(future)
+
+    async def fetch(self, guild: discord.Guild, user_id: int) -> discord.Member:
+        """Como `resolve` pero lanza MemberNotFound si no está en el server"""
+
+        member = await self.resolve(guild, user_id)
+        if member is None:
+            raise MemberNotFound(str(user_id))
+        return member
+
+    def _flush(self, guild: discord.Guild):
+        user_ids = self._batches.pop(guild.id, [])
+        for start in range(0, len(user_ids), MAX_BATCH):
+            asyncio.ensure_future(self._query(guild, user_ids[start:start + MAX_BATCH]))
+
+    async def _query(self, guild: discord.Guild, user_ids: list):
+        found = {}
+        failed = set()
+        try:
+            try:
+                members = await guild.query_members(user_ids=user_ids, cache=True)
+                found = {member.id: member for member in members}
+            except (discord.ClientException, asyncio.TimeoutError) as e:
+                # Sin acceso al gateway se piden de a uno por REST
+                log.warning("query_members failed (%s), falling back to fetch_member", e)
+                for user_id in user_ids:
+                    try:
+                        found[user_id] = await guild.fetch_member(user_id)
+                    except discord.NotFound:
+                        pass
+                    except discord.HTTPException as e:
+                        log.error("Error fetching member %s: %s", user_id, e)
+                        failed.add(user_id)
+                        self._set_result(guild, user_id, exception=e)
+        except Exception as e:
+            for user_id in user_ids:
+                self._set_result(guild, user_id, exception=e)
+            return
+
+        for user_id in user_ids:
+            if user_id in failed:
+                continue
+            member = found.get(user_id)
+            if member is None:
+                self.missing.set((guild.id, user_id), True)
+            self._set_result(guild, user_id, member)
+
+    def _set_result(self, guild, user_id, member=None, exception=None):
+        future = self._pending.pop((guild.id, user_id), None)
+        if future is None or future.done():
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(member)
+
+    def invalidate(self, guild_id: int, user_id: int):
+        self.missing.invalidate((guild_id, int(user_id)))
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+import json
+import time
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+
+
+def iter_json_array(path: str, chunk_size: int = 64 * 1024):
+    """ Recorre los elementos de un archivo json
+
+    El archivo puede tener un array json o un documento por línea (NDJSON,
+    como los que genera `export_collection`). Lee el archivo de a
+    `chunk_size` bytes y decodifica un elemento a la vez, así la memoria
+    usada no depende del tamaño del archivo.
+    """
+
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as file:
+        buffer = ""
+        started = False
+        array = False
+        eof = False
+        while True:
+            buffer = buffer.lstrip()
+            if not started:
+                if buffer:
+                    started = True
+                    if buffer[0] == "[":
+                        array = True
+                        buffer = buffer[1:]
+                    continue
+            elif array and buffer[:1] == ",":
+                buffer = buffer[1:]
+                continue
+            elif array and buffer[:1] == "]":
+                return
+            elif buffer:
+                try:
+                    item, end = decoder.raw_decode(buffer)
+                except json.JSONDecodeError:
+                    # El elemento quedó cortado, hace falta leer más
+                    if eof:
+                        raise
+                else:
+                    yield item
+                    buffer = buffer[end:]
+                    continue
+
+            if eof:
+                if array:
+                    raise ValueError(f"{path}: unexpected end of file")
+                return
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+
+
+class BulkMigration:
+    """ Migración masiva reanudable
+
+    Envía los registros con `send` con hasta `concurrency` requests en vuelo.
+    Cada registro migrado se agrega al archivo `checkpoint`, así si la
+    migración se corta, al volver a correrla se saltean los que ya están.
+
+    `send` es una corrutina que recibe un registro y devuelve True si se
+    migró; los que fallan no se marcan y se reintentan en la próxima corrida.
+    `key` devuelve el identificador único de un registro.
+
+    migration = BulkMigration(iter_json_array("data.json"), send, key, "data.done")
+    stats = await migration.run(on_progress=report)
+    """
+
+    def __init__(self, records, send, key, checkpoint: str, concurrency: int = 8):
+        self.records = records
+        self.send = send
+        self.key = key
+        self.checkpoint = checkpoint
+        self.concurrency = concurrency
+
+        self.migrated = 0
+        self.skipped = 0
+        self.errors = 0
+        self._started = None
+
+    def _load_checkpoint(self) -> set:
+        try:
+            with open(self.checkpoint, encoding="utf-8") as file:
+                return {line.rstrip("\n") for line in file if line.strip()}
+        except FileNotFoundError:
+            return set()
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self._started if self._started else 0
+        return {
+            "migrated": self.migrated,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "elapsed": elapsed,
+            "rate": self.migrated / elapsed if elapsed else 0,
+        }
+
+    async def _worker(self, queue: asyncio.Queue, done_file):
+        while True:
+            record = await queue.get()
+            try:
+                if await self.send(record):
+                    self.migrated += 1
+                    done_file.write(f"{self.key(record)}\n")
+                    done_file.flush()
+                else:
+                    self.errors += 1
+            except Exception as e:
+                self.errors += 1
+                log.error("Migration error on %s: %s", self.key(record), e)
+            finally:
+                queue.task_done()
+
+    async def run(self, on_progress=None, interval: float = 5.0) -> dict:
+        """ Corre la migración
+
+        `on_progress` es una corrutina opcional que recibe `stats()` cada
+        `interval` segundos y al terminar.
+        """
+
+        done = self._load_checkpoint()
+        self._started = time.monotonic()
+        last_report = self._started
+        # La cola acotada hace que el archivo se lea al ritmo de los envíos
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        with open(self.checkpoint, "a", encoding="utf-8") as done_file:
+            workers = [asyncio.ensure_future(self._worker(queue, done_file))
+                       for _ in range(self.concurrency)]
+            try:
+                for record in self.records:
+                    if self.key(record) in done:
+                        self.skipped += 1
+                        continue
+                    await queue.put(record)
+
+                    if on_progress and time.monotonic() - last_report >= interval:
+                        last_report = time.monotonic()
+                        await on_progress(self.stats())
+                await queue.join()
+            finally:
+                for worker in workers:
+                    worker.cancel()
+
+        stats = self.stats()
+        log.info("Migration finished: %s", stats)
+        if on_progress:
+            await on_progress(stats)
+        return stats
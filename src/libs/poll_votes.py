@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+
+import time
+import asyncio
+import logging
+from collections import Counter
+
+from faunadb.errors import NotFound
+
+log = logging.getLogger(__name__)
+
+# Tipos de encuesta en los que cada persona vota una sola opción
+SINGLE_VOTE_TYPES = ("normal", "custom", "weighted")
+# Tipos de encuesta en los que se puede quitar un voto quitando la reacción
+REMOVABLE_TYPES = ("multi", "ranked", "weighted")
+
+
+def instant_runoff(ballots: Counter, options: list):
+    """ Cuenta una votación por ranking (instant runoff)
+
+    `ballots` agrupa las boletas iguales: {("A", "B"): 10, ("B",): 3}, así el
+    costo depende de la cantidad de boletas distintas y no de votantes. En
+    cada ronda se elimina la opción con menos votos (ante un empate, la
+    última en el orden de la encuesta) hasta que una tenga mayoría.
+
+    Devuelve la opción ganadora y el conteo de cada ronda.
+    """
+
+    remaining = list(options)
+    rounds = []
+    while True:
+        counts = {option: 0 for option in remaining}
+        for ballot, count in ballots.items():
+            for option in ballot:
+                if option in counts:
+                    counts[option] += count
+                    break
+        rounds.append(counts)
+
+        total = sum(counts.values())
+        winner = max(remaining, key=lambda option: counts[option])
+        if len(remaining) <= 2 or counts[winner] * 2 > total:
+            return winner, rounds
+        loser = min(reversed(remaining), key=lambda option: counts[option])
+        remaining.remove(loser)
+
+
+class PollState:
+    """ Estado en memoria de una encuesta
+
+    Los votos se aplican localmente y se acumulan como deltas pendientes
+    hasta que el agregador los escribe en la base de datos. Las personas que
+    votaron se guardan en un set, así verificar un voto es O(1) sin importar
+    el tamaño de la encuesta.
+
+    Los conteos se mantienen de forma incremental con cada reacción que se
+    agrega o se quita. En las encuestas `ranked` el conteo es de primeras
+    preferencias y las boletas se agrupan en `ballots` para resolver el
+    instant runoff al cerrar.
+    """
+
+    def __init__(self, ref, data: dict, ballots=()):
+        self.ref = ref
+        self.id = data['id']
+        self.type = data['type']
+        self.question = data['question']
+        self.author = data['author']
+        self.avatar_url = data['avatar_url']
+        self.is_active = data['is_active']
+        self.votes = dict(data['votes_count'])
+        # Las encuestas viejas guardan la lista de votantes en el documento
+        self.voters = set(data.get('users_voted', []))
+        # Opciones elegidas por cada persona, en orden: user_id -> [(option, weight)]
+        self.selections = {}
+        # Boletas de ranking agrupadas: (option, ...) -> cantidad
+        self.ballots = Counter()
+
+        # Los conteos guardados ya incluyen los votos que se cargan
+        for _, user_id, option, weight in sorted(ballots, key=lambda b: b[0] or 0):
+            self.voters.add(user_id)
+            if self.type in REMOVABLE_TYPES:
+                self.selections.setdefault(user_id, []).append((option, weight or 1))
+        if self.type == "ranked":
+            for selection in self.selections.values():
+                self.ballots[tuple(option for option, _ in selection)] += 1
+
+        # Deltas que todavía no se escribieron en la base de datos
+        self.pending_votes = {}
+        self.pending_adds = []
+        self.pending_removes = []
+
+    @property
+    def single_vote(self) -> bool:
+        return self.type in SINGLE_VOTE_TYPES
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.pending_adds or self.pending_removes)
+
+    def has_voted(self, user_id: int) -> bool:
+        return user_id in self.voters
+
+    def _bump(self, option: str, delta):
+        self.votes[option] += delta
+        self.pending_votes[option] = self.pending_votes.get(option, 0) + delta
+
+    def _ballot(self, user_id: int) -> tuple:
+        return tuple(option for option, _ in self.selections.get(user_id, []))
+
+    def _rank(self, before: tuple, after: tuple):
+        """Actualizo las boletas y las primeras preferencias de un ranking"""
+
+        if before:
+            self.ballots[before] -= 1
+            if not self.ballots[before]:
+                del self.ballots[before]
+        if after:
+            self.ballots[after] += 1
+        first_before = before[0] if before else None
+        first_after = after[0] if after else None
+        if first_before != first_after:
+            if first_before is not None:
+                self._bump(first_before, -1)
+            if first_after is not None:
+                self._bump(first_after, 1)
+
+    def vote(self, user_id: int, option: str, weight: int = 1) -> bool:
+        """ Registra un voto
+
+        Devuelve False si el voto no es válido: la opción no existe, ya se
+        eligió esa opción o, en encuestas de voto único, ya se votó.
+        No hay ningún await entre la verificación y la escritura, así que dos
+        reacciones simultáneas no pueden pisarse.
+        """
+
+        if option not in self.votes:
+            return False
+        if self.single_vote and self.has_voted(user_id):
+            return False
+        if option in self._ballot(user_id):
+            return False
+
+        self.voters.add(user_id)
+        if self.type in REMOVABLE_TYPES:
+            before = self._ballot(user_id)
+            self.selections.setdefault(user_id, []).append((option, weight))
+            if self.type == "ranked":
+                self._rank(before, self._ballot(user_id))
+            else:
+                self._bump(option, weight)
+        else:
+            self._bump(option, weight)
+        self.pending_adds.append((user_id, option, weight, time.time_ns()))
+        return True
+
+    def unvote(self, user_id: int, option: str) -> bool:
+        """ Quita un voto
+
+        Solo se puede en los tipos de encuesta de `REMOVABLE_TYPES`.
+        """
+
+        if self.type not in REMOVABLE_TYPES:
+            return False
+        selection = self.selections.get(user_id, [])
+        weights = [weight for selected, weight in selection if selected == option]
+        if not weights:
+            return False
+
+        before = self._ballot(user_id)
+        selection.remove((option, weights[0]))
+        if not selection:
+            del self.selections[user_id]
+            self.voters.discard(user_id)
+        if self.type == "ranked":
+            self._rank(before, self._ballot(user_id))
+        else:
+            self._bump(option, -weights[0])
+
+        # Si el voto todavía no se escribió, alcanza con descartarlo
+        for add in self.pending_adds:
+            if add[0] == user_id and add[1] == option:
+                self.pending_adds.remove(add)
+                break
+        else:
+            self.pending_removes.append((user_id, option))
+        return True
+
+    def runoff(self):
+        """Resuelve una encuesta `ranked`, ver `instant_runoff`"""
+
+        return instant_runoff(self.ballots, list(self.votes))
+
+    def results(self) -> list:
+        """Lista de (opción, votos) ordenada de mayor a menor"""
+
+        if self.type == "ranked":
+            _, rounds = self.runoff()
+            votes = rounds[-1]
+        else:
+            votes = self.votes
+        return sorted(votes.items(), key=lambda vote: vote[1], reverse=True)
+
+    def take_pending(self):
+        """Devuelve los deltas pendientes y los reinicia"""
+
+        pending = (self.pending_votes, self.pending_adds, self.pending_removes)
+        self.pending_votes, self.pending_adds, self.pending_removes = {}, [], []
+        return pending
+
+    def restore_pending(self, votes: dict, adds: list, removes: list):
+        """Vuelve a encolar deltas que no se pudieron escribir"""
+
+        for option, count in votes.items():
+            self.pending_votes[option] = self.pending_votes.get(option, 0) + count
+        self.pending_adds = adds + self.pending_adds
+        self.pending_removes = removes + self.pending_removes
+
+
+class VoteAggregator:
+    """ Agregador write-behind de votos
+
+    Mantiene en memoria las encuestas activas, aplica los votos de forma
+    local y cada `interval` segundos escribe en la base de datos un único
+    update por encuesta con todos los votos acumulados.
+
+    `active_ids` tiene los ids de discord de todas las encuestas activas,
+    así las reacciones a otros mensajes se descartan sin ir a la red.
+    """
+
+    def __init__(self, db, interval: float = 5.0):
+        self.db = db
+        self.interval = interval
+        self.active_ids = set()
+        self.loaded = False
+        self._polls = {}
+        self._loading = {}
+        self._task = None
+
+    async def load_active(self):
+        """Cargo los ids de las encuestas activas desde la base de datos"""
+
+        self.active_ids = {poll_id async for poll_id in self.db.iter_active_poll_ids()}
+        self.loaded = True
+        log.info("%s active polls", len(self.active_ids))
+
+    def is_active(self, message_id: int) -> bool:
+        """ Indica si el mensaje es una encuesta activa
+
+        Mientras no se cargó el índice no se descarta ningún mensaje.
+        """
+
+        return not self.loaded or message_id in self.active_ids
+
+    def _ensure_flush_loop(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def _load(self, message_id: int):
+        try:
+            poll = await self.db.get_poll_by_discord_id(message_id)
+        except NotFound:
+            return None
+        # Solo se guardan en memoria las encuestas activas
+        if poll['data']['is_active']:
+            ballots = await self.db.get_poll_ballots(message_id)
+            state = PollState(poll['ref'], poll['data'], ballots)
+            self._polls[message_id] = state
+        else:
+            state = PollState(poll['ref'], poll['data'])
+            self.active_ids.discard(message_id)
+        return state
+
+    def add(self, ref, data: dict) -> PollState:
+        """Registra una encuesta recién creada"""
+
+        state = PollState(ref, data)
+        self._polls[state.id] = state
+        self.active_ids.add(state.id)
+        return state
+
+    async def get(self, message_id: int):
+        """ Obtengo el estado de una encuesta
+
+        Si no está en memoria se lee de la base de datos una única vez, aunque
+        lleguen varias reacciones a la vez.
+        """
+
+        state = self._polls.get(message_id)
+        if state is not None:
+            return state
+
+        task = self._loading.get(message_id)
+        if task is None:
+            task = asyncio.ensure_future(self._load(message_id))
+            self._loading[message_id] = task
+            task.add_done_callback(lambda _: self._loading.pop(message_id, None))
+        return await asyncio.shield(task)
+
+    def vote(self, state: PollState, user_id: int, option: str, weight: int = 1) -> bool:
+        """Aplica un voto y agenda la escritura"""
+
+        accepted = state.vote(user_id, option, weight)
+        if accepted:
+            self._ensure_flush_loop()
+        return accepted
+
+    def unvote(self, state: PollState, user_id: int, option: str) -> bool:
+        """Quita un voto y agenda la escritura"""
+
+        removed = state.unvote(user_id, option)
+        if removed:
+            self._ensure_flush_loop()
+        return removed
+
+    async def _flush_state(self, state: PollState):
+        if not state.dirty:
+            return
+        votes, adds, removes = state.take_pending()
+        try:
+            await self.db.apply_poll_votes(state.ref, state.id, votes, adds, removes)
+            log.info("Poll %s: %s votes added, %s removed",
+                     state.id, len(adds), len(removes))
+        except Exception as e:
+            state.restore_pending(votes, adds, removes)
+            log.error("Poll %s: error flushing votes: %s", state.id, e)
+
+    async def flush(self, message_id: int = None):
+        """Escribe los votos pendientes de una o de todas las encuestas"""
+
+        if message_id is not None:
+            states = [self._polls[message_id]] if message_id in self._polls else []
+        else:
+            states = list(self._polls.values())
+        await asyncio.gather(*(self._flush_state(state) for state in states))
+
+    async def close(self, message_id: int):
+        """Escribe los votos pendientes y quita la encuesta de memoria"""
+
+        await self.flush(message_id)
+        self.active_ids.discard(message_id)
+        return self._polls.pop(message_id, None)
+
+    async def stop(self):
+        """Detiene el loop de escritura y escribe todo lo pendiente"""
+
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import time
+import asyncio
+from collections import deque
+
+
+class TokenBucket:
+    """ Token bucket para limitar la frecuencia de una operación
+
+    Se reponen `rate` tokens por segundo hasta un máximo de `capacity`, cada
+    operación consume un token y si no hay disponibles espera.
+
+    bucket = TokenBucket(rate=1, capacity=5)
+    await bucket.acquire()
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        # El lock mantiene el orden de llegada entre los que esperan
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class RateDetector:
+    """ Cuenta eventos en una ventana deslizante de `window` segundos
+
+    joins = RateDetector(window=60)
+    joins.hit()
+    joins.count()  # eventos en el último minuto
+    """
+
+    def __init__(self, window: float = 60):
+        self.window = window
+        self._events = deque()
+
+    def _expire(self, now: float):
+        while self._events and self._events[0] <= now - self.window:
+            self._events.popleft()
+
+    def hit(self):
+        now = time.monotonic()
+        self._events.append(now)
+        self._expire(now)
+
+    def count(self) -> int:
+        self._expire(time.monotonic())
+        return len(self._events)
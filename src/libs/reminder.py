@@ -3,10 +3,10 @@
 import logging
 from datetime import datetime, timezone
 
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from discord import User
 
-from libs.database import Database as DB
+from libs.database import AsyncDatabase as DB
+from libs.reminder_core import get_scheduler, resume_scheduler, run_job, register_job_owner
 
 log = logging.getLogger(__name__)
 
@@ -28,13 +28,12 @@ class Reminder:
     Se encarga de almacenar los eventos y crear recordatorios.
     """
 
-    def __init__(self, secret):
+    def __init__(self, db: DB):
         # Accedo a la base de datos
-        self.db = DB(secret)
+        self.db = db
 
-        # Arranco en Async Scheduler
-        self.sched = AsyncIOScheduler()
-        self.sched.start()
+        # Uso el Async Scheduler compartido
+        self.sched = get_scheduler()
 
 
     @property
@@ -47,6 +46,13 @@ class Reminder:
         if not isinstance(value, str):
             raise ValueError("The value must be a string")
         self._collection = value
+        register_job_owner(self.owner, self)
+
+
+    @property
+    def owner(self) -> str:
+        """Nombre con el que los jobs persistentes encuentran a esta instancia"""
+        return f"{type(self).__name__}:{self.collection}"
 
 
     @property
@@ -87,57 +93,80 @@ class Reminder:
 
     # Funciones privadas
 
-    def _remove_by_id(self, id_: str):
+    def _job_ids(self, ref_id: str) -> list:
+        """Ids de los jobs de un evento: uno por recordatorio y el de limpieza"""
+
+        return [f"{ref_id}:{i}" for i in range(len(self.reminders))] + [f"{ref_id}:end"]
+
+
+    def _remove_jobs(self, doc):
+        # Los documentos viejos guardan los ids de jobs con id aleatorio
+        for job_id in self._job_ids(doc['ref'].id()) + doc['data'].get('jobs', []):
+            if self.sched.get_job(job_id):
+                self.sched.remove_job(job_id)
+
+
+    async def _remove_by_id(self, id_: str):
         try:
-            doc = self.db.delete(self.collection, id_)
+            doc = await self.db.delete(self.collection, id_)
             log.info("hola: %s", doc)
-            for job in doc['data']['jobs']:
-                self.sched.remove_job(job)
+            self._remove_jobs(doc)
             return doc
         except:
             return []
 
 
-    def _remove_by_id_and_author(self, id_: str, author: str):
+    async def _remove_by_id_and_author(self, id_: str, author: str):
         try:
-            doc = self.db.delete_by_id_and_author(self.collection, self.indexes['by_id_and_author'], id_, author)
-            for job in doc['data']['jobs']:
-                self.sched.remove_job(job)
+            doc = await self.db.delete_by_id_and_author(self.collection, self.indexes['by_id_and_author'], id_, author)
+            self._remove_jobs(doc)
             return doc
         except:
             return []
 
 
     async def _remove_old_event(self):
-        self.db.delete_by_expired_time(self.indexes['by_time'])
+        await self.db.delete_by_expired_time(self.indexes['by_time'])
+
 
+    def _has_stored_jobs(self) -> bool:
+        """Indica si el job store persistente ya tiene los jobs de esta instancia"""
 
-    def _create_jobs(self, event):
+        return any(job.args[:1] == (self.owner,)
+                   for job in self.sched.get_jobs(jobstore='default'))
+
+
+    def _create_jobs(self, event, ref_id: str):
+        """
+        Creo los jobs de un evento, sus ids salen del id del documento (ver
+        `_job_ids`), así no hace falta guardarlos y volver a crearlos
+        reemplaza a los existentes
+        """
         dt_event = event['time']
         dt_now = datetime.utcnow().replace(tzinfo=timezone.utc)
+        *reminder_ids, end_id = self._job_ids(ref_id)
 
-        jobs_id = []
-        for reminder in event['reminders']:
+        for job_id, reminder in zip(reminder_ids, event['reminders']):
             if dt_event > dt_now + reminder['delta']:
                 log.info("Added event")
-                job = self.sched.add_job(
-                    self.action,
+                self.sched.add_job(
+                    run_job,
                     'date',
+                    id=job_id,
+                    replace_existing=True,
                     run_date=(dt_event - reminder['delta']),
-                    args=[reminder['message'], event['content'], event['channel']]
+                    args=[self.owner, 'action', reminder['message'], event['content'], event['channel']]
                 )
-                jobs_id.append(job.id)
 
         # Job para eliminar el registro de la base de datos
-        job = self.sched.add_job(
-            self._remove_old_event,
+        self.sched.add_job(
+            run_job,
             'date',
+            id=end_id,
+            replace_existing=True,
             run_date=(dt_event),
-            args=[]
+            args=[self.owner, '_remove_old_event']
         )
-        jobs_id.append(job.id)
-
-        return jobs_id
 
 
     def _generate_event(self, author, date_time, channel, content):
@@ -165,7 +194,6 @@ class Reminder:
                 return []
 
             event = self._generate_event(author, date_time, channel, content)
-            jobs_id = self._create_jobs(event)
 
             # Guardo el evento en la base de datos
             data = {
@@ -174,12 +202,13 @@ class Reminder:
                 "time": self.db.q.time(event['time'].isoformat()),
                 "str_time": event['time'].strftime("%Y-%m-%d | %H:%M | %z"),
                 "content": event['content'],
-                "channel": event['channel'],
-                "jobs": jobs_id
+                "channel": event['channel']
             }
 
-            # Genero un registro local
-            return self.db.create(self.collection, data)
+            # Genero un registro local y los jobs con su id
+            doc = await self.db.create(self.collection, data)
+            self._create_jobs(event, doc['ref'].id())
+            return doc
         except:
             # Si el formato de la fecha es incorrecto
             return None
@@ -191,13 +220,18 @@ class Reminder:
         Se utiliza para cargar los eventos que están guardados en la base de
         datos al momento de inciar el programa.
 
-        Lee los eventos de la base de datos, los carga en el scheduler y
-        actuliza la base de datos con los nuevos jobs_id
+        Si el job store persistente ya tiene los jobs no hace nada. Si no,
+        lee los eventos de la base de datos y los carga en el scheduler. Los
+        ids de los jobs salen del id del documento, así que no se escribe nada
+        en la base de datos.
         """
 
-        docs = self.db.get_all(self.indexes['all'])
-        new_docs = []
-        for doc in docs['data']:
+        resume_scheduler()
+        if self._has_stored_jobs():
+            log.info("Jobs for %s already in job store, skipping reload", self.owner)
+            return
+
+        async for doc in self.db.iter_all(self.indexes['all']):
             event = {
                 "content":   doc['data']['content'],
                 "time":      datetime.fromisoformat(f"{doc['data']['time'].value[:-1]}+00:00"),
@@ -206,21 +240,16 @@ class Reminder:
             }
 
             # Creo los jobs
-            jobs_id = self._create_jobs(event)
-            new_docs.append((doc['ref'].id(), {"jobs": jobs_id}))
-
-        # Actulizo la base de datos con los nuevos jobs_id
-        return self.db.update_all_jobs(self.collection, new_docs)
+            self._create_jobs(event, doc['ref'].id())
 
 
     async def list(self):
         """Lista todos los eventos programados"""
 
-        events = self.db.get_all_by_time(self.indexes['by_time'])
-        return events['data']
+        return [event async for event in self.db.iter_all_by_time(self.indexes['by_time'])]
 
 
     async def remove(self, id_, author):
         """Borro un evento programado"""
 
-        return self._remove_by_id_and_author(id_, author)
+        return await self._remove_by_id_and_author(id_, author)
@@ -1,15 +1,91 @@
 # -*- coding: utf-8 -*-
 
-from datetime import date, datetime, timezone
-import logging
+from datetime import date, datetime, timedelta, timezone
+import os
 import sys
+import time
+import logging
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-import dateparser
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.base import STATE_PAUSED
 from discord import User
-from libs.database import Database as DB
+from libs.database import AsyncDatabase as DB, parse_fauna_time
 
 log = logging.getLogger(__name__)
 
+_scheduler = None
+
+# Tamaño de página al cargar los recordatorios
+LOAD_PAGE_SIZE = 500
+
+# Segundos de atraso con los que todavía se ejecuta un job
+MISFIRE_GRACE_TIME = 60
+
+# Instancias que ejecutan los jobs persistentes, ver `run_job`
+_owners = {}
+
+
+def get_scheduler() -> AsyncIOScheduler:
+    """ Devuelve el AsyncIOScheduler compartido por todo el proceso
+
+    Lo usan los recordatorios y cualquier módulo que necesite programar
+    tareas, por ejemplo el cierre automático de encuestas.
+
+    Los jobs del job store `default` se guardan en una base SQLite
+    (SCHEDULER_DB_URL), así sobreviven a un reinicio y no hace falta volver
+    a crearlos. En docker la base tiene que estar en un volumen, si no se
+    pierde cada vez que se recrea el contenedor (ver deploy.yml). Los jobs
+    que no se pueden serializar, o que se vuelven a crear al iniciar, van
+    al job store `memory`.
+
+    El scheduler arranca pausado: los jobs guardados recién se ejecutan
+    después de `resume_scheduler`, cuando el bot ya está conectado.
+    """
+
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = AsyncIOScheduler(
+            jobstores={
+                'default': SQLAlchemyJobStore(
+                    url=os.getenv("SCHEDULER_DB_URL", "sqlite:///jobs.sqlite")),
+                'memory': MemoryJobStore()
+            },
+            job_defaults={'coalesce': True, 'misfire_grace_time': MISFIRE_GRACE_TIME}
+        )
+        _scheduler.start(paused=True)
+    return _scheduler
+
+
+def resume_scheduler():
+    """Empiezo a ejecutar los jobs, se llama en el `on_ready` de los cogs"""
+
+    scheduler = get_scheduler()
+    if scheduler.state == STATE_PAUSED:
+        scheduler.resume()
+
+
+def register_job_owner(owner: str, instance):
+    """Registro la instancia que ejecuta los jobs persistentes de `owner`"""
+
+    _owners[owner] = instance
+
+
+async def run_job(owner: str, method: str, *args):
+    """ Punto de entrada de los jobs persistentes
+
+    El job store guarda la referencia a esta función y sus argumentos, que
+    tienen que poder serializarse. Por eso el job no apunta a un método, sino
+    al nombre de la instancia que lo ejecuta (registrada con
+    `register_job_owner` al definir su colección) y al nombre del método.
+    """
+
+    instance = _owners.get(owner)
+    if instance is None:
+        log.warning("Job owner %s is not registered, skipping job", owner)
+        return
+    await getattr(instance, method)(*args)
+
 
 class ReminderCore:
     """ Clase ReminderBase
@@ -21,9 +97,8 @@ class ReminderCore:
         # Accedo a la base de datos
         self.db = db
 
-        # Arranco en Async Scheduler
-        self.sched = AsyncIOScheduler()
-        self.sched.start()
+        # Uso el Async Scheduler compartido
+        self.sched = get_scheduler()
 
     @property
     def collection(self):
@@ -34,6 +109,12 @@ class ReminderCore:
         if not isinstance(value, str):
             raise ValueError("The value must be a string")
         self._collection = value
+        register_job_owner(self.owner, self)
+
+    @property
+    def owner(self) -> str:
+        """Nombre con el que los jobs persistentes encuentran a esta instancia"""
+        return f"{type(self).__name__}:{self.collection}"
 
     @property
     def indexes(self):
@@ -57,37 +138,61 @@ class ReminderCore:
 
     # Funciones privadas
 
-    def _remove_by_id(self, id_: str):
+    def _remove_job(self, doc):
+        """
+        Elimino el job de un documento, su id es el id del documento. Los
+        documentos viejos guardan el id de un job con id aleatorio
+        """
+        for job_id in (doc['ref'].id(), doc['data'].get('job')):
+            if job_id is not None and self.sched.get_job(job_id):
+                self.sched.remove_job(job_id)
+
+    async def _remove_by_id(self, id_: str):
         try:
-            doc = self.db.delete(self.collection, id_)
-            self.sched.remove_job(doc['data']['job'])
+            doc = await self.db.delete(self.collection, id_)
+            self._remove_job(doc)
             return doc
         except:
             return []
 
-    def _remove_by_id_and_author(self, id_: str, author: str):
+    async def _remove_by_id_and_author(self, id_: str, author: str):
         try:
-            doc = self.db.delete_by_id_and_author(
+            doc = await self.db.delete_by_id_and_author(
                 self.collection, self.indexes['by_id_and_author'], id_, author)
-            self.sched.remove_job(doc['data']['job'])
+            self._remove_job(doc)
             return doc
         except:
             return None
 
-    async def _remove_old_event(self):
-        self.db.delete_by_expired_time(self.indexes['by_time'])
-
-    def _create_job(self, event):
+    async def _fire_date(self, ref_id: str, message, content, channel):
+        """
+        Ejecuto un recordatorio de tipo date y elimino su documento, el job
+        ya no existe después de ejecutarse
         """
-        Creo un job en el scheduler y obtengo el id del mismo.
+        try:
+            await self.action(message, content, channel)
+        finally:
+            try:
+                await self.db.delete(self.collection, ref_id)
+            except Exception as e:
+                log.error("Error deleting fired reminder %s: %s", ref_id, e)
+
+    def _create_job(self, event, ref_id: str):
+        """
+        Creo un job en el scheduler con el id del documento como id, así no
+        hace falta guardarlo y volver a crearlo reemplaza al existente.
         Los args son los datos del recordatorio para el método `self.action`.
+        Los recordatorios de tipo date usan `ref_id` para eliminar su
+        documento al ejecutarse.
         """
 
         if event['type'] == 'cron':
             cron = event['cron']
-            job = self.sched.add_job(
-                self.action,
+            self.sched.add_job(
+                run_job,
                 'cron',
+                id=ref_id,
+                replace_existing=True,
                 year=cron.get('year'),
                 month=cron.get('month'),
                 day=cron.get('day'),
@@ -98,19 +203,19 @@ class ReminderCore:
                 start_date=cron.get('start_date'),
                 end_date=cron.get('end_date'),
                 timezone=cron.get('timezone'),
-                args=[event['message'], event['content'],
+                args=[self.owner, 'action', event['message'], event['content'],
                       event['channel']]
             )
-            return job.id
         elif event['type'] == 'date':
-            job = self.sched.add_job(
-                self.action,
+            self.sched.add_job(
+                run_job,
                 'date',
+                id=ref_id,
+                replace_existing=True,
                 run_date=event['time'],
-                args=[event['message'], event['content'],
+                args=[self.owner, '_fire_date', ref_id, event['message'], event['content'],
                       event['channel']]
             )
-            return job.id
         else:
             log.warn("Event type has to be 'cron' or 'date': %s", event)
 
@@ -147,7 +252,6 @@ class ReminderCore:
 
         event = self._generate_event(
             'cron', cron, author, channel, message, content)
-        job_id = self._create_job(event)
 
         # Guardo el evento en la base de datos
         data = {
@@ -158,12 +262,13 @@ class ReminderCore:
             'message':       event['message'],
             'created_at': date_time_now.strftime("%Y-%m-%d | %H:%M | %z"),
             'cron':       event['cron'],
-            'job':        job_id,
             'type':       'cron'
         }
 
-        # Genero un registro local
-        return self.db.create(self.collection, data)
+        # Genero un registro local y el job con su id
+        doc = await self.db.create(self.collection, data)
+        self._create_job(event, doc['ref'].id())
+        return doc
 
     async def add_date(self, author: User, channel: str, message: str, content, time: datetime) -> dict:
         """Agrega un nuevo recordatio de tipo date"""
@@ -184,8 +289,6 @@ class ReminderCore:
 
             event = self._generate_event(
                 'date', date_time, author, channel, message, content)
-            job_id = self._create_job(event)
-
             # Guardo el evento en la base de datos
             data = {
                 'author':     event['author'],
@@ -194,34 +297,75 @@ class ReminderCore:
                 'message':       event['message'],
                 'content':    event['content'],
                 'created_at': date_time_now.strftime("%Y-%m-%d | %H:%M | %z"),
-                'job':        job_id,
                 'str_time':   event['time'].strftime("%Y-%m-%d | %H:%M | %z"),
                 'time':       self.db.q.time(event['time'].isoformat()),
                 'type':       'date'
             }
 
             log.info(f'DATOS: {data}')
-            # Genero un registro local
-            return self.db.create(self.collection, data)
+            # Genero un registro local y el job con su id
+            doc = await self.db.create(self.collection, data)
+            self._create_job(event, doc['ref'].id())
+            return doc
         except:
             # Si el formato de la fecha es incorrecto
             log.error(f'Error... {sys.exc_info()[0]}')
             return {}
 
+    def _has_stored_jobs(self) -> bool:
+        """Indica si el job store persistente ya tiene los jobs de esta instancia"""
+
+        return any(job.args[:1] == (self.owner,)
+                   for job in self.sched.get_jobs(jobstore='default'))
+
+    async def _purge_expired(self):
+        """
+        Elimino los recordatorios de tipo date que vencieron mientras el bot
+        estaba apagado. APScheduler descarta sus jobs sin ejecutarlos, así que
+        `_fire_date` nunca borraría sus documentos. Los que vencieron hace
+        menos de `MISFIRE_GRACE_TIME` se ejecutan igual y se borran solos.
+        """
+        started = time.perf_counter()
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=MISFIRE_GRACE_TIME)
+        expired = []
+        async for doc in self.db.iter_by_expired_time(self.indexes['by_time'], size=LOAD_PAGE_SIZE):
+            if doc['data'].get('type') != 'date' or parse_fauna_time(doc['data']['time']) >= cutoff:
+                continue
+            self._remove_job(doc)
+            expired.append(doc['ref'].id())
+        if expired:
+            await self.db.delete_many(self.collection, expired)
+        log.info("Deleted %s expired reminders in %.2fs",
+                 len(expired), time.perf_counter() - started)
+
     async def load(self):
         """ Carga los eventos de la base de datos
 
         Se utiliza para cargar los eventos que están guardados en la base de
         datos al momento de inciar el programa.
 
-        Lee los eventos de la base de datos, los carga en el scheduler y
-        actuliza la base de datos con los nuevos jobs_id
+        Si el job store persistente ya tiene los jobs solo elimina los
+        recordatorios vencidos. Si no (por ejemplo, la primera vez), lee los
+        eventos de la base de datos, elimina los vencidos y los carga en el
+        scheduler. Los jobs usan el id
+        del documento, así que no se escribe nada más en la base de datos.
         """
 
-        docs = self.db.get_all(self.indexes['all'])
-        new_docs = []
-        for doc in docs['data']:
-            event = {}
+        resume_scheduler()
+        if self._has_stored_jobs():
+            log.info("Jobs for %s already in job store, skipping reload", self.owner)
+            try:
+                await self._purge_expired()
+            except Exception as e:
+                log.error("Error deleting expired reminders: %s", e)
+            return
+
+        # Lectura: recorro todas las páginas de recordatorios
+        started = time.perf_counter()
+        # Los vencidos hace menos de MISFIRE_GRACE_TIME se ejecutan igual
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=MISFIRE_GRACE_TIME)
+        events, expired = [], []
+        async for doc in self.db.iter_all(self.indexes['all'], size=LOAD_PAGE_SIZE):
             event_type = doc['data']['type']
             if event_type == 'cron':
                 event = {
@@ -232,37 +376,43 @@ class ReminderCore:
                     'type':    'cron'
                 }
             elif event_type == 'date':
-                if dateparser.parse(doc['data']['time'].value[:-1]) < datetime.utcnow():
-                    log.info(
-                        f'Recordatorio {doc["data"]["content"]["title"]} ya pasó, se elimina')
-
+                date_time = parse_fauna_time(doc['data']['time'])
+                if date_time < cutoff:
+                    expired.append(doc['ref'].id())
                     continue
-                else:
-                    event = {
-                        'channel': doc['data']['channel'],
-                        'content': doc['data']['content'],
-                        'message': doc['data']['message'],
-                        'time':    datetime.fromisoformat(f"{doc['data']['time'].value[:-1]}+00:00"),
-                        'type':    'date'
-                    }
+                event = {
+                    'channel': doc['data']['channel'],
+                    'content': doc['data']['content'],
+                    'message': doc['data']['message'],
+                    'time':    date_time,
+                    'type':    'date'
+                }
             else:
                 continue
-
-            # Creo el job
-            job_id = self._create_job(event)
-            new_docs.append((doc['ref'].id(), {"job": job_id}))
-
-        # Actulizo la base de datos con los nuevos jobs_id
-        return self.db.update_all_jobs(self.collection, new_docs)
+            events.append((doc['ref'].id(), event))
+        log.info("Read %s reminders (%s expired) in %.2fs",
+                 len(events) + len(expired), len(expired), time.perf_counter() - started)
+
+        # Elimino los recordatorios vencidos en una sola query
+        started = time.perf_counter()
+        if expired:
+            await self.db.delete_many(self.collection, expired)
+        log.info("Deleted %s expired reminders in %.2fs",
+                 len(expired), time.perf_counter() - started)
+
+        # Creo los jobs, como su id es el del documento no hay nada que guardar
+        started = time.perf_counter()
+        for ref_id, event in events:
+            self._create_job(event, ref_id)
+        log.info("Created %s jobs in %.2fs", len(events), time.perf_counter() - started)
 
     async def list(self, author: str):
         """Lista todos los eventos programados"""
 
-        events = self.db.get_by_author(
-            index=self.indexes['by_author'], author=author)
-        return events['data']
+        return [event async for event in self.db.iter_by_author(
+            index=self.indexes['by_author'], author=author)]
 
     async def remove(self, id_, author) -> dict:
         """Borro un evento programado"""
 
-        return self._remove_by_id_and_author(id_, author)
+        return await self._remove_by_id_and_author(id_, author)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class RenderScheduler:
+    """ Agenda la edición de mensajes colapsando actualizaciones
+
+    Cada mensaje se edita como máximo una vez por `window` segundos. Las
+    actualizaciones que llegan mientras tanto se colapsan en una sola
+    edición, que se genera en ese momento para mostrar siempre el último
+    estado.
+
+    renders.request(msg, lambda: generate_embed(poll))
+    """
+
+    def __init__(self, window: float = 2.0):
+        self.window = window
+        self._pending = {}
+        self._tasks = {}
+
+        # Métricas
+        self.requested = 0
+        self.edits = 0
+
+    @property
+    def coalesced(self) -> int:
+        """Cantidad de actualizaciones que no necesitaron una edición propia"""
+
+        return self.requested - self.edits - len(self._pending)
+
+    def stats(self) -> dict:
+        return {
+            "requested": self.requested,
+            "edits": self.edits,
+            "coalesced": self.coalesced,
+            "pending": len(self._pending),
+        }
+
+    def request(self, message, render):
+        """ Pide editar un mensaje
+
+        `render` es una función sin argumentos que devuelve el embed, se
+        llama recién al momento de editar.
+        """
+
+        self.requested += 1
+        self._pending[message.id] = (message, render)
+        if message.id not in self._tasks:
+            self._tasks[message.id] = asyncio.ensure_future(self._run(message.id))
+
+    def cancel(self, message_id: int):
+        """Descarta las ediciones pendientes de un mensaje"""
+
+        self._pending.pop(message_id, None)
+        task = self._tasks.pop(message_id, None)
+        if task is not None:
+            task.cancel()
+
+    def stop(self):
+        """Descarta todas las ediciones pendientes"""
+
+        for message_id in list(self._tasks):
+            self.cancel(message_id)
+        self._pending.clear()
+
+    async def _run(self, message_id: int):
+        try:
+            while message_id in self._pending:
+                message, render = self._pending.pop(message_id)
+                self.edits += 1
+                try:
+                    await message.edit(embed=render())
+                except Exception as e:
+                    log.error("Error editing message %s: %s", message_id, e)
+                log.debug("Render stats: %s", self.stats())
+                # Lo que llegue durante la ventana se colapsa en la próxima edición
+                await asyncio.sleep(self.window)
+        finally:
+            if self._tasks.get(message_id) is asyncio.current_task():
+                del self._tasks[message_id]
@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import json
+import html
+import time
+import asyncio
+import logging
+import unicodedata
+from bisect import bisect_left
+import urllib.parse as parse
+
+import aiohttp
+
+from libs.cache import TTLCache, MISSING
+
+log = logging.getLogger(__name__)
+
+_shared_service = None
+
+# Extraigo solo los links de resultados, sin armar el árbol de todo el HTML
+_DDG_RESULT = re.compile(
+    r'<a[^>]*class="result__a"[^>]*href="(?P<href>[^"]+)"[^>]*>(?P<title>.*?)</a>'
+    r'|<a[^>]*href="(?P<href2>[^"]+)"[^>]*class="result__a"[^>]*>(?P<title2>.*?)</a>',
+    re.S)
+_TAG = re.compile(r"<[^>]+>")
+_TOKEN = re.compile(r"\w+")
+
+# Índice local que se distribuye con el bot (src/faq.json)
+DEFAULT_FAQ_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "faq.json")
+
+# Límites (en segundos) de los buckets de los histogramas de latencia
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class SearchBackend:
+    """ Proveedor de búsqueda
+
+    Cada proveedor implementa `search` y devuelve una lista de (título, link)
+    ordenada por relevancia.
+    """
+
+    name = None
+
+    async def search(self, session: aiohttp.ClientSession, query: str, num: int = 5) -> list:
+        raise NotImplementedError
+
+
+class DuckDuckGoSearch(SearchBackend):
+    """ Búsqueda en la versión HTML de DuckDuckGo
+
+    results = await DuckDuckGoSearch().search(session, "python asyncio")
+    """
+
+    name = "duckduckgo"
+    url = "https://html.duckduckgo.com/html/"
+    headers = {'user-agent': 'Mozilla/5.0'}
+
+    async def search(self, session: aiohttp.ClientSession, query: str, num: int = 5) -> list:
+        async with session.get(self.url, params={'q': query}, headers=self.headers) as res:
+            res.raise_for_status()
+            text = await res.text()
+        return self.parse(text, num)
+
+    @staticmethod
+    def parse(text: str, num: int = 5) -> list:
+        """Devuelvo hasta `num` resultados (título, link) de la página"""
+
+        result = []
+        for match in _DDG_RESULT.finditer(text):
+            href = html.unescape(match.group("href") or match.group("href2"))
+            title = html.unescape(_TAG.sub("", match.group("title") or match.group("title2"))).strip()
+
+            # Los links pasan por la redirección de DuckDuckGo: //duckduckgo.com/l/?uddg=<url>
+            # Los anuncios (result--ad) apuntan a duckduckgo.com/y.js y no tienen uddg
+            url = parse.urlsplit(href)
+            link = parse.parse_qs(url.query).get("uddg", [None])[0]
+            if link is None:
+                if url.netloc.endswith("duckduckgo.com") or url.path.endswith("/y.js"):
+                    continue
+                link = href
+            if title == "" or link == "":
+                continue
+            result.append((title, link))
+            if len(result) >= num:
+                break
+        return result
+
+
+class MDNSearch(SearchBackend):
+    """ Búsqueda en la documentación de MDN (developer.mozilla.org)
+
+    results = await MDNSearch(locale="es").search(session, "array map")
+    """
+
+    name = "mdn"
+    base_url = "https://developer.mozilla.org"
+    url = base_url + "/api/v1/search"
+
+    def __init__(self, locale: str = "es"):
+        self.locale = locale
+
+    async def search(self, session: aiohttp.ClientSession, query: str, num: int = 5) -> list:
+        params = {'q': query, 'locale': self.locale, 'size': num}
+        async with session.get(self.url, params=params) as res:
+            res.raise_for_status()
+            data = await res.json()
+        return [(doc["title"], self.base_url + doc["mdn_url"])
+                for doc in data.get("documents", [])[:num]]
+
+
+def _tokens(text: str) -> list:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _TOKEN.findall(text)
+
+
+class LocalIndexSearch(SearchBackend):
+    """ Búsqueda en un índice local de FAQs y documentación, sin red
+
+    El índice es un archivo JSON con una lista de documentos:
+
+        [{"title": "...", "url": "...", "keywords": ["..."], "text": "..."}]
+
+    Se carga una sola vez y se arma un índice invertido por palabra. Cada
+    palabra de la búsqueda que aparece en el título suma el doble que si
+    aparece en las keywords o el texto.
+
+    results = await LocalIndexSearch("./faq.json").search(None, "como preguntar")
+    """
+
+    name = "faq"
+
+    def __init__(self, path: str):
+        self.path = path
+        self.documents = []
+        self.index = {}
+        self.load()
+
+    def load(self):
+        with open(self.path, encoding="utf-8") as f:
+            documents = json.load(f)
+
+        index = {}
+        for position, doc in enumerate(documents):
+            words = " ".join([doc.get("text", "")] + doc.get("keywords", []))
+            for token in set(_tokens(words)):
+                index.setdefault(token, {})[position] = 1
+            for token in set(_tokens(doc["title"])):
+                index.setdefault(token, {})[position] = 2
+
+        self.documents, self.index = documents, index
+        log.info("Local search index %s: %d documents", self.path, len(documents))
+
+    async def search(self, session: aiohttp.ClientSession, query: str, num: int = 5) -> list:
+        scores = {}
+        for token in set(_tokens(query)):
+            for position, weight in self.index.get(token, {}).items():
+                scores[position] = scores.get(position, 0) + weight
+
+        # Ante el mismo puntaje respeto el orden del archivo
+        best = sorted(scores, key=lambda position: (-scores[position], position))[:num]
+        return [(self.documents[p]["title"], self.documents[p]["url"]) for p in best]
+
+
+class LatencyHistogram:
+    """ Histograma de latencias de un proveedor
+
+    `counts[i]` cuenta las respuestas que tardaron hasta `buckets[i]`
+    segundos, la última posición las que tardaron más. Además se cuentan los
+    errores y las veces que el proveedor no respondió antes del deadline.
+    """
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.errors = 0
+        self.late = 0
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+
+    def stats(self) -> dict:
+        labels = [f"<={bucket}s" for bucket in self.buckets] + [f">{self.buckets[-1]}s"]
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else None,
+            "errors": self.errors,
+            "late": self.late,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+def _url_key(url: str) -> str:
+    """Normalizo el link para detectar el mismo resultado en distintos proveedores"""
+
+    parts = parse.urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    return f"{host}{parts.path.rstrip('/')}?{parts.query}"
+
+
+def merge_results(results: list, num: int) -> list:
+    """ Combino los resultados de cada proveedor
+
+    Tomo uno de cada proveedor por turno, en el orden de la lista, y descarto
+    los links repetidos.
+    """
+
+    merged, seen = [], set()
+    for rank in range(max(map(len, results), default=0)):
+        for items in results:
+            if rank >= len(items):
+                continue
+            title, link = items[rank]
+            key = _url_key(link)
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append((title, link))
+            if len(merged) >= num:
+                return merged
+    return merged
+
+
+class SearchService:
+    """ Servicio de búsqueda web
+
+    Consulta a todos los proveedores en paralelo y responde con lo que haya
+    llegado antes de `deadline` segundos, así un proveedor lento no demora la
+    respuesta. Los resultados se combinan sin repetir links.
+
+    Usa una única `aiohttp.ClientSession` y guarda los resultados de cada
+    proveedor en un cache LRU con vencimiento, indexado por la búsqueda
+    normalizada. Un proveedor que no llega al deadline sigue hasta terminar
+    (o hasta el timeout) y su resultado queda en el cache para la próxima.
+    Si llega una búsqueda igual a otra que está en curso, espera ese mismo
+    resultado en vez de repetir el request.
+
+    search = get_search_service()
+    results = await search.search("python asyncio")
+    """
+
+    def __init__(self, backends: list = None, ttl: float = 600, maxsize: int = 256,
+                 timeout: float = 10, deadline: float = 3):
+        self.backends = backends if backends is not None else [DuckDuckGoSearch()]
+        self.cache = TTLCache(ttl=ttl, maxsize=maxsize)
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.deadline = deadline
+        self.latency = {backend.name: LatencyHistogram() for backend in self.backends}
+        self._session = None
+        self._inflight = {}
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=self.timeout)
+        return self._session
+
+    async def _fetch(self, backend: SearchBackend, key: tuple, query: str, num: int) -> list:
+        histogram = self.latency[backend.name]
+        started = time.perf_counter()
+        try:
+            result = await backend.search(self._get_session(), query, num)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            histogram.errors += 1
+            log.warning("Search backend %s error: %r", backend.name, e)
+            return []
+
+        histogram.observe(time.perf_counter() - started)
+        self.cache.set(key, result)
+        return result
+
+    def _backend_search(self, backend: SearchBackend, query: str, num: int):
+        key = (backend.name, self.normalize(query))
+        result = self.cache.get(key)
+        if result is not MISSING:
+            future = asyncio.get_event_loop().create_future()
+            future.set_result(result)
+            return future
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(backend, key, query, num))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    async def search(self, query: str, num: int = 5) -> list:
+        tasks = [self._backend_search(backend, query, num) for backend in self.backends]
+        if not tasks:
+            return []
+
+        # shield: al vencer el deadline los proveedores lentos no se cancelan
+        waiting = [asyncio.shield(task) for task in tasks]
+        done, pending = await asyncio.wait(waiting, timeout=self.deadline)
+        for backend, future in zip(self.backends, waiting):
+            if future in pending:
+                self.latency[backend.name].late += 1
+                log.info("Search backend %s missed the %ss deadline", backend.name, self.deadline)
+                future.cancel()
+
+        results = [future.result() for future in waiting if future in done]
+        return merge_results(results, num)
+
+    def stats(self) -> dict:
+        return {name: histogram.stats() for name, histogram in self.latency.items()}
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+def get_backends(names: str, faq_path: str = None) -> list:
+    """ Arma la lista de proveedores a partir de sus nombres separados por coma
+
+    El índice local solo se usa si el archivo existe.
+    """
+
+    backends = []
+    for name in (name.strip().lower() for name in names.split(",")):
+        if name == DuckDuckGoSearch.name:
+            backends.append(DuckDuckGoSearch())
+        elif name == MDNSearch.name:
+            backends.append(MDNSearch())
+        elif name == LocalIndexSearch.name:
+            if faq_path and os.path.isfile(faq_path):
+                backends.append(LocalIndexSearch(faq_path))
+            else:
+                log.warning("Search index %s not found, skipping the faq backend", faq_path)
+        elif name:
+            log.warning("Unknown search backend: %s", name)
+    return backends
+
+
+def get_search_service() -> SearchService:
+    """ Devuelve el SearchService compartido por todo el proceso
+
+    SEARCH_BACKENDS: proveedores en orden de prioridad (default faq,duckduckgo,mdn)
+    SEARCH_FAQ_PATH: índice local en JSON (default src/faq.json)
+    SEARCH_DEADLINE: segundos que se espera a los proveedores (default 3)
+    SEARCH_CACHE_TTL: segundos que se guarda cada búsqueda (default 600)
+    SEARCH_TIMEOUT: timeout de cada request en segundos (default 10)
+    """
+
+    global _shared_service
+    if _shared_service is None:
+        _shared_service = SearchService(
+            backends=get_backends(
+                os.getenv("SEARCH_BACKENDS", "faq,duckduckgo,mdn"),
+                os.getenv("SEARCH_FAQ_PATH") or DEFAULT_FAQ_PATH
+            ),
+            ttl=float(os.getenv("SEARCH_CACHE_TTL", "600")),
+            timeout=float(os.getenv("SEARCH_TIMEOUT", "10")),
+            deadline=float(os.getenv("SEARCH_DEADLINE", "3"))
+        )
+    return _shared_service
@@ -1,12 +1,45 @@
 # -*- coding: utf-8 -*-
+"""
+Cada módulo es una extension de discord.py con su función `setup`:
 
-from .help import Help
-from .welcome import Welcome
-# from .events import Events
-# from .scheduler import Scheduler
-from .polls import Polls
-# from .search import Search
-from .newMembers import NewMembers
-from .info import Info
-from .mentorships import Mentorship
-# from .reminders import Reminders # To fix
+    bot.load_extension("modules.polls")
+
+Los cogs también se pueden obtener desde el paquete; se importan recién
+cuando se usan (PEP 562), así los módulos que no están activos, y sus
+dependencias, no se cargan al iniciar el bot.
+
+    import modules
+    bot.add_cog(modules.Polls(bot))  # recién acá se importa modules.polls
+"""
+
+import importlib
+
+# Nombre del cog -> submódulo que lo define
+_COGS = {
+    "Help": "help",
+    "Welcome": "welcome",
+    "Events": "events",
+    "Scheduler": "scheduler",
+    "Polls": "polls",
+    "Search": "search",
+    "NewMembers": "newMembers",
+    "Info": "info",
+    "Mentorship": "mentorships",
+    "Reminders": "reminders",
+    "Admin": "admin",
+}
+
+__all__ = list(_COGS)
+
+
+def __getattr__(name):
+    if name not in _COGS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    cog = getattr(importlib.import_module(f".{_COGS[name]}", __name__), name)
+    # Lo guardo en el módulo para no volver a pasar por acá
+    globals()[name] = cog
+    return cog
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,92 @@
+# Modulo Admin.py
+# Cargar, descargar y recargar módulos del bot sin reiniciarlo
+
+# ///---- Imports ----///
+import os
+import logging
+
+from discord.ext.commands import Cog, group, MissingRequiredArgument, ExtensionError
+from discord.ext.commands.core import has_role
+from discord.ext.commands.errors import MissingRole
+
+# ///---- Log ----///
+log = logging.getLogger(__name__)
+
+PACKAGE = "modules"
+
+
+# ///---- Clase ----///
+class Admin(Cog):
+    '''
+    Administrar los módulos (extensions) del bot en caliente
+    '''
+
+    admins_role_id = 645411178398351363
+
+    def __init__(self, bot):
+        '''
+        __init__ del bot (importa este codigo como modulo al bot)
+        '''
+        self.bot = bot
+        self.PREFIX = os.getenv("DISCORD_PREFIX")
+
+    @staticmethod
+    def _extension(name: str) -> str:
+        return name if name.startswith(f"{PACKAGE}.") else f"{PACKAGE}.{name}"
+
+    async def _run(self, ctx, action: str, name: str):
+        extension = self._extension(name)
+        if action != "load" and extension == __name__:
+            return await ctx.send("❌No se puede descargar el módulo admin", delete_after=30)
+        try:
+            getattr(self.bot, f"{action}_extension")(extension)
+        except ExtensionError as e:
+            log.error("Module %s %s error: %s", extension, action, e)
+            return await ctx.send(f"❌Error: {e}", delete_after=30)
+        log.info("Module %s: %s", extension, action)
+        await ctx.send(f"✅Módulo `{name}`: {action} ok", delete_after=30)
+
+    # >module
+    #! Comando module
+    @group(invoke_without_command=True)
+    @has_role(admins_role_id)
+    async def module(self, ctx):
+        '''
+        Lista los módulos cargados
+        '''
+        loaded = sorted(name[len(PACKAGE) + 1:] for name in self.bot.extensions)
+        await ctx.send(f"""
+Módulos cargados: {", ".join(f"`{name}`" for name in loaded)}
+Uso: `{self.PREFIX}module load|unload|reload <módulo>`
+""", delete_after=60)
+
+    @module.command()
+    @has_role(admins_role_id)
+    async def load(self, ctx, name):
+        await self._run(ctx, "load", name)
+
+    @module.command()
+    @has_role(admins_role_id)
+    async def unload(self, ctx, name):
+        await self._run(ctx, "unload", name)
+
+    @module.command()
+    @has_role(admins_role_id)
+    async def reload(self, ctx, name):
+        await self._run(ctx, "reload", name)
+
+    @module.error
+    @load.error
+    @unload.error
+    @reload.error
+    async def module_error(self, ctx, error):
+        if isinstance(error, MissingRole):
+            await ctx.channel.send("Solo Admins puede ejecutar este comando", delete_after=30)
+        elif isinstance(error, MissingRequiredArgument):
+            await ctx.channel.send(f"Por favor, indicar el módulo. Ej: `{self.PREFIX}module reload polls`", delete_after=30)
+        else:
+            raise error
+
+
+def setup(bot):
+    bot.add_cog(Admin(bot))
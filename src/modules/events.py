@@ -92,3 +92,7 @@ class TwitterStream:
             self.external_func(msg),
             self.loop
         )
+
+
+def setup(bot):
+    bot.add_cog(Events(bot))
@@ -41,3 +41,7 @@ class Help(commands.Cog):
 
         embed = h.generate_embed()
         await ctx.send(embed=embed, delete_after=60)
+
+
+def setup(bot):
+    bot.add_cog(Help(bot))
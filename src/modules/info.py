@@ -91,4 +91,7 @@ Uso:
     async def on_command_error(self, ctx, error):
         if isinstance(error, MissingRequiredArgument):
             await ctx.channel.send(f"Falta etiquetar al usuario. Para más información usar ```{self.PREFIX}info help```", delete_after=15)
-        
\ No newline at end of file
+
+
+def setup(bot):
+    bot.add_cog(Info(bot))
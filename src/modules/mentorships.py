@@ -2,12 +2,9 @@
 # This module is for adding/removing the Mentee role for FrontendCafé's mentorings
 
 # ///---- Imports ----///
-import json
 import re
 import os
 import logging
-from urllib import response
-import requests
 
 import discord
 from discord.embeds import Embed
@@ -17,7 +14,12 @@ from discord.ext.commands.errors import MissingAnyRole, MissingRole
 import faunadb
 from datetime import datetime
 # Database
-from libs.database import Database as DB
+from libs.database import get_database
+from libs.aws_client import get_aws_client
+from libs.members import MemberResolver
+from libs.cache import TTLCache
+from libs.migration import BulkMigration, iter_json_array
+from libs.export import export_ndjson
 from modules.help import EmbedGenerator
 
 # ///---- Log ----///
@@ -35,17 +37,24 @@ class Mentorship(Cog):
         __init__ del bot (importa este codigo como modulo al bot)
         '''
         self.bot = bot
-        secret = os.getenv("FAUNADB_SECRET_KEY")
-        self.db = DB(secret)
+        self.db = get_database()
         self.PREFIX = os.getenv("DISCORD_PREFIX")
-        self.AWS_URL = os.getenv("AWS_URL")
-        self.AWS_HEADERS = {'x-api-key': os.getenv("AWS_API_KEY")}
+        self.aws = get_aws_client()
+        self.members = MemberResolver()
+        # Mentees que el backend rechazó en `add` (-118), solo se cachea lo que respondió
+        self.penalized = TTLCache(ttl=int(os.getenv("MENTEE_STATUS_TTL", "600")))
+        self.migration_concurrency = int(os.getenv("MIGRATION_CONCURRENCY", "8"))
 
     def validateDiscordUser(self, user):
         regex = re.compile(r"\<\@(\!|.)\d+\>")
         valid = re.fullmatch(regex, user)
         return valid
 
+    @Cog.listener()
+    async def on_member_join(self, member):
+        # Si estaba marcado como ausente deja de estarlo
+        self.members.invalidate(member.guild.id, member.id)
+
     admin_mentor_role_id = 875764700418297868
     mentors_role_id = 645409801844555787
     staff_role_id = 936626779798507601
@@ -62,7 +71,7 @@ class Mentorship(Cog):
         await ctx.message.delete()
         if self.validateDiscordUser(user):
             userId = re.search(r'\d+', user).group()
-            member = await ctx.guild.fetch_member(userId)
+            member = await self.members.fetch(ctx.guild, userId)
             menteeRole = discord.utils.get(ctx.guild.roles, name="Mentees")
 
             if menteeRole in member.roles and time is None and channel is None:
@@ -151,9 +160,6 @@ class Mentorship(Cog):
         '''
         Comando mentee warn
         '''
-        AWS_URL = self.AWS_URL
-        AWS_HEADERS = self.AWS_HEADERS
-
         async def success_message(ctx, member, userId):
             now = datetime.now()
             message = f"""
@@ -184,10 +190,13 @@ class Mentorship(Cog):
                 await ctx.message.delete()
 
                 userId = int(re.search(r'\d+', user).group())
-                member = await ctx.guild.fetch_member(userId)
+                member = await self.members.fetch(ctx.guild, userId)
                 menteeRole = discord.utils.get(ctx.guild.roles, name="Mentees")
                 await member.remove_roles(menteeRole)
-                request = requests.post(f'{AWS_URL}/matebot/warning', headers=AWS_HEADERS, json={
+                # Si la penalización bloquea nuevas mentorías lo decide el backend,
+                # se sabrá en el próximo `add`
+                self.penalized.invalidate(userId)
+                response = await self.aws.post('/matebot/warning', json={
                     "mentee_id": str(userId),
                     "mentee_username_discord": member.display_name,
                     'warning_author_id': str(ctx.message.author.id),
@@ -195,7 +204,6 @@ class Mentorship(Cog):
                     'warn_cause': ' '.join(reason) if reason else 'Ausencia a la mentoría',
                     'warn_type':  'COC_WARN' if reason else 'NO_ASSIST'
                 })
-                response = request.json()
                 print(response)
                 if response['code'] == "300":
                     await success_message(ctx, member, userId)
@@ -224,9 +232,6 @@ class Mentorship(Cog):
         '''
         Comando mentee warn remove
         '''
-        AWS_URL = self.AWS_URL
-        AWS_HEADERS = self.AWS_HEADERS
-
         async def success_message(ctx, member, userId):
             message = f"""
     > :point_right:  **Se ha removido la penalización a {member.mention}**
@@ -261,17 +266,19 @@ class Mentorship(Cog):
         try:
             await ctx.message.delete()
             userId = int(re.search(r'\d+', user).group())
-            member = await ctx.guild.fetch_member(userId)
-            request = requests.patch(f'{AWS_URL}/warning/mentee/{str(userId)}', headers=AWS_HEADERS, json={
+            member = await self.members.fetch(ctx.guild, userId)
+            # Puede tener otras penalizaciones, hasta no saberlo se vuelve a consultar
+            self.penalized.invalidate(userId)
+            response = await self.aws.patch(f'/warning/mentee/{str(userId)}', json={
                 "forgive_cause": ' '.join(forgive_cause) if forgive_cause else 'Sin motivo',
                 "forgive_author_id": ctx.message.author.id,
                 "forgive_author_username_discord": ctx.message.author.display_name
             })
-            response = request.json()
 
             if response['code'] == "303":
                 await success_message(ctx, member, userId)
             elif response['code'] == "301":
+                self.penalized.set(userId, False)
                 await no_warnings_message(ctx, member, userId)
             else:
                 await error_message(ctx, userId)
@@ -340,9 +347,6 @@ class Mentorship(Cog):
         '''
         Comando mentee add
         '''
-        AWS_URL = self.AWS_URL
-        AWS_HEADERS = self.AWS_HEADERS
-
         async def rejected_message(ctx, member, userId):
             adminMentorsRole = discord.utils.get(
                 ctx.guild.roles, id=self.admin_mentor_role_id)
@@ -378,17 +382,22 @@ class Mentorship(Cog):
         try:
             await ctx.message.delete()
             userId = int(re.search(r'\d+', user).group())
-            member = await ctx.guild.fetch_member(userId)
-            request = requests.post(f'{AWS_URL}/matebot/mentorship', headers=AWS_HEADERS, json={
+            member = await self.members.fetch(ctx.guild, userId)
+            # Si ya sabemos que está penalizado no hace falta consultar al backend
+            if self.penalized.get(userId) is True:
+                await rejected_message(ctx, member, userId)
+                return
+            response = await self.aws.post('/matebot/mentorship', json={
                 "mentor_id": str(ctx.message.author.id),
                 "mentor_username_discord": ctx.message.author.display_name,
                 "mentee_id": str(userId),
                 "mentee_username_discord": member.display_name})
-            response = request.json()
 
             if response['code'] == "-118":
+                self.penalized.set(userId, True)
                 await rejected_message(ctx, member, userId)
             elif response['code'] == "100":
+                self.penalized.set(userId, False)
                 await success_message(ctx, member, userId)
             else:
                 await error_message(ctx, userId)
@@ -410,29 +419,22 @@ class Mentorship(Cog):
     @mentee.command()
     @has_role(admins_role_id)
     async def migrate_warnings(self, ctx, warn_quantity=0):
-        try:
-            counter = 0
-            with open("./all_warned_mentees.json") as file:
-                warningData = json.load(file)
-                for x in warningData:
-                    if x['data']['warns_quantity'] > warn_quantity:
-                        request = requests.post(f'{self.AWS_URL}/matebot/warning', headers=self.AWS_HEADERS, json={
-                            "warning_date": str(x['ts'])[0:-3],
-                            "mentee_id": x['data']['id'],
-                            "mentee_username_discord": x['data']['warned_user'],
-                            'warning_author_id': '811059299160817665',
-                            'warning_author_username_discord': 'Matebot 🧉#4564',
-                            'warn_cause': 'Ausencia a la mentoría',
-                            'warn_type': 'NO_ASSIST'
-                        })
-                        response = request.json()
-                        print(response)
-                        counter += 1
-                await ctx.channel.send(f"Se migraron {counter} warnings")
-                print('WARNINGS MIGRATED')
-        except Exception as e:
-            await ctx.channel.send(f"Ocurrió un error: {e}")
-            print(e)
+        async def send(x):
+            response = await self.aws.post('/matebot/warning', json={
+                "warning_date": str(x['ts'])[0:-3],
+                "mentee_id": x['data']['id'],
+                "mentee_username_discord": x['data']['warned_user'],
+                'warning_author_id': '811059299160817665',
+                'warning_author_username_discord': 'Matebot 🧉#4564',
+                'warn_cause': 'Ausencia a la mentoría',
+                'warn_type': 'NO_ASSIST'
+            })
+            return response.get('code') == "300"
+
+        records = (x for x in iter_json_array("./all_warned_mentees.json")
+                   if x['data']['warns_quantity'] > warn_quantity)
+        await self._migrate(ctx, "warnings", records, send, key=lambda x: x['data']['id'],
+                            checkpoint="./all_warned_mentees.done")
 
     @migrate_warnings.error
     async def migrate_warnings_error(self, ctx, error):
@@ -448,25 +450,42 @@ class Mentorship(Cog):
     @mentee.command()
     @has_role(admins_role_id)
     async def migrate_mentorships(self, ctx):
+        async def send(x):
+            response = await self.aws.post('/matebot/mentorship', json={
+                "mentorship_date": str(x['ts'])[0:-3],
+                "mentor_id": str(x['data']['author_id']),
+                "mentor_username_discord": x['data']['author'],
+                "mentee_id": str(x['data']['mentee_id']),
+                "mentee_username_discord": x['data']['mentee']})
+            return response.get('code') == "100"
+
+        await self._migrate(ctx, "mentorías", iter_json_array("./mentorships.json"), send,
+                            key=lambda x: f"{x['ts']}-{x['data']['mentee_id']}",
+                            checkpoint="./mentorships.done")
+
+    async def _migrate(self, ctx, name, records, send, key, checkpoint):
+        '''
+        Corre una migración masiva informando el progreso en un mensaje.
+        Si se corta, al volver a ejecutar el comando se retoma desde el checkpoint
+        '''
+        status = await ctx.channel.send(f"Migrando {name}...")
+
+        async def report(stats):
+            await status.edit(content=(
+                f"Migrando {name}: {stats['migrated']} migrados, "
+                f"{stats['skipped']} ya migrados, {stats['errors']} errores "
+                f"({stats['rate']:.1f}/s)"))
+
+        migration = BulkMigration(records, send, key, checkpoint,
+                                  concurrency=self.migration_concurrency)
         try:
-            counter = 0
-            with open("./mentorships.json") as file:
-                mentorshipData = json.load(file)
-                for x in mentorshipData:
-                    request = requests.post(f'{self.AWS_URL}/matebot/mentorship', headers=self.AWS_HEADERS, json={
-                        "mentorship_date": str(x['ts'])[0:-3],
-                        "mentor_id": str(x['data']['author_id']),
-                        "mentor_username_discord": x['data']['author'],
-                        "mentee_id": str(x['data']['mentee_id']),
-                        "mentee_username_discord": x['data']['mentee']})
-                    response = request.json()
-                    counter += 1
-                    print(response)
-                print('FINISHED')
-                await ctx.channel.send(f"Se migraron {counter} mentorías")
+            stats = await migration.run(on_progress=report)
+            await ctx.channel.send(
+                f"Se migraron {stats['migrated']} {name} en {stats['elapsed']:.0f}s "
+                f"({stats['errors']} errores, se reintentan al volver a ejecutar el comando)")
         except Exception as e:
             await ctx.channel.send(f"Ocurrió un error: {e}")
-            print(e)
+            log.error("Migration error: %s", e)
 
     @migrate_warnings.error
     async def migrate_warnings_error(self, ctx, error):
@@ -478,23 +497,21 @@ class Mentorship(Cog):
 
     @mentee.command()
     @has_role(admins_role_id)
-    async def export_collection(self, ctx, collection):
+    async def export_collection(self, ctx, collection, compress=None):
         '''
         Comando mentee export_collection
+        Exporta todos los documentos en NDJSON, con `gz` se comprime el archivo
         '''
         try:
             await ctx.message.delete()
-            collection_data = self.db.get_all(collection)
-            # Write file
-            with open(f"{collection}.json", "w") as file:
-                file.write(
-                    json.dumps(collection_data['data'], default=lambda o: o.__dict__,
-                               sort_keys=True, indent=4))
+            gz = compress == "gz"
+            file, count = await export_ndjson(self.db, collection, compress=gz)
+            filename = f"{collection}.ndjson{'.gz' if gz else ''}"
             # Send file
-            with open(f"{collection}.json", "rb") as file:
-                await ctx.send("Lista:", file=discord.File(file, f"{collection}.json"))
+            with file:
+                await ctx.send(f"Lista ({count} documentos):", file=discord.File(file, filename))
         except Exception as e:
-            print(e)
+            log.error("Error exporting %s: %s", collection, e)
 
     @export_collection.error
     async def mentee_error(self, ctx, error):
@@ -503,3 +520,7 @@ class Mentorship(Cog):
             await ctx.channel.send("Solo Admins puede ejecutar este comando", delete_after=30)
         else:
             raise error
+
+
+def setup(bot):
+    bot.add_cog(Mentorship(bot))
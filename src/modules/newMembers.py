@@ -4,12 +4,13 @@ Los mensajes de bienvenida se eliminan luego de una hora
 '''
 
 # ///---- Imports ----///
+import os
+import asyncio
 import logging
 import random
-import os
 from time import time
 from discord.ext import commands
-from libs.database import Database as DB
+from libs.database import get_database
 
 #///---- Log ----///
 log = logging.getLogger(__name__)
@@ -18,67 +19,128 @@ log = logging.getLogger(__name__)
 class NewMembers(commands.Cog):
     '''
     Saludo de bienvenida al server
+
+    La lista de usuarios nuevos y los parámetros del lote se mantienen en
+    memoria, cada ingreso es una operación local y el estado se guarda en la
+    base de datos cada `checkpoint_interval` segundos si hubo cambios.
     '''
     def __init__(self, bot):
         '''
         __init__ del bots
         '''
-        secret = os.getenv("FAUNADB_SECRET_KEY")
         self.bot = bot
-        self.db = DB(secret)
-        self.get_list()
+        self.db = get_database()
         self.channel_test = 861980330201841686
         self.channel_cafe = 594935077637718027
         self.channel_manual = 747925827265495111
         self.guild_id = 594363964499165194
 
+        self.state = None
+        self.dirty = False
+        self.checkpoint_interval = float(os.getenv("NEW_MEMBERS_CHECKPOINT", "30"))
+        self._lock = asyncio.Lock()
+        self._task = None
+
+
+    def cog_unload(self):
+        if self._task is not None:
+            self._task.cancel()
+        # Guardo el estado pendiente antes de descargar el módulo
+        self.bot.loop.create_task(self.checkpoint())
+
+
+    async def shutdown(self):
+        # Al cerrar el bot se espera a que se guarde el estado pendiente
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.checkpoint()
 
-    def get_list(self):
+
+    async def get_list(self):
         '''
         Descripción: Obtiene la lista de usuarios nuevos y otros parámetros para análisis
         Precondición: Debe existir la colección con el documento
         Poscondición: Se obtiene la lista de usuarios nuevos, la condición de usuarios nuevos, el tiempo de inicio y el tiempo de espera
         '''
         try:
-            doc = self.db.get('Users', '292960205647380995')["data"]
+            doc = (await self.db.get('Users', '292960205647380995'))["data"]
             return (doc)
         except Exception as error:
             print(f'Hubo un error en get_list: {error}')
 
 
-    def update_list(self, list_users: list, users: int, time_zero: float, delta: float):
+    async def update_list(self, list_users: list, users: int, time_zero: float, delta: float) -> bool:
         '''
         Descripción: Actualiza la lista de usuarios nuevos, la condición de usuarios nuevos y el tiempo de espera
         Precondición: Debe existir la colección con el documento
         Poscondición: La lista de usuarios nuevos, la condición de usuarios nuevos y el tiempo de espera se actualizan
         '''
         try:
-            self.db.update('Users', '292960205647380995', {
+            await self.db.update('Users', '292960205647380995', {
                 "new_users_id": list_users,
                 "user_condition": users,
                 "time_sec": time_zero,
                 "time_delta": delta
             })
+            return True
         except Exception as error:
             print(f'Hubo un error en update_list: {error}')
+            return False
+
+
+    async def load_state(self):
+        '''
+        Descripción: Carga el estado desde la base de datos una única vez
+        Poscondición: Se devuelve el estado en memoria, o None si no se pudo cargar
+        '''
+        async with self._lock:
+            if self.state is None:
+                self.state = await self.get_list()
+                if self.state is not None and self._task is None:
+                    self._task = asyncio.ensure_future(self._checkpoint_loop())
+        return self.state
+
+
+    async def checkpoint(self):
+        '''
+        Descripción: Guarda el estado en memoria en la base de datos si hubo cambios
+        '''
+        if not self.dirty or self.state is None:
+            return
+        self.dirty = False
+        state = self.state
+        saved = await self.update_list(
+            list(state["new_users_id"]), state["user_condition"], state["time_sec"], state["time_delta"])
+        if not saved:
+            self.dirty = True
+
+
+    async def _checkpoint_loop(self):
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            await self.checkpoint()
 
 
     @commands.Cog.listener()
     async def on_member_join(self, member):
         '''
-        Descripción: Se activa cuando un nuevo usuario entra al servidor y se guarda su id en la base de datos
+        Descripción: Se activa cuando un nuevo usuario entra al servidor y se guarda su id en el buffer en memoria
         Precondición: Debe existir la colección con el documento
         Poscondición: Se activa el mensaje de bienvenida a los nuevos miembros de FrontendCafé al alcanzar el número de usuarios necesarios
         '''
         new_member = member.mention
-        package = self.get_list()
-        list_users, users, time_zero, delta = package["new_users_id"], package["user_condition"], package["time_sec"], package["time_delta"]
+        state = await self.load_state()
+        if state is None:
+            return
+        list_users, users, time_zero, delta = state["new_users_id"], state["user_condition"], state["time_sec"], state["time_delta"]
         new_users = []
         impostor = '<:fecimpostor:755971090471321651>'
         fec_star = '<:fecstar:755451362950512660>'
 
         list_users.append(new_member)
-        
+        self.dirty = True
+
         if (len(list_users) == users):
             guild = self.bot.get_guild(self.guild_id)
             time_final = time()
@@ -90,17 +152,23 @@ class NewMembers(commands.Cog):
                 users += 1
 
             cafe = self.bot.get_channel(self.channel_cafe)
-            
+
             for user in list_users:
                 parse_user = int(user[2:-1])
                 if guild.get_member(parse_user) is not None:
                     new_users.append(user)
-            
-            list_users = []
-            self.update_list(list_users, users, time_final, new_delta)
+
+            state.update({
+                "new_users_id": [],
+                "user_condition": users,
+                "time_sec": time_final,
+                "time_delta": new_delta
+            })
             await cafe.send(
                 f'''{fec_star} Welcome {" ".join(set(new_users))}!
 Pueden presentarse en este canal, <#{self.channel_cafe}> y leer el <#{self.channel_manual}> para conocer cómo participar en nuestra comunidad {impostor}''')
             new_users = []
-        else:
-            self.update_list(list_users, users, time_zero, delta)
\ No newline at end of file
+
+
+def setup(bot):
+    bot.add_cog(NewMembers(bot))
@@ -4,13 +4,17 @@
 import re
 import os
 import logging
+from datetime import datetime, timedelta, timezone
 
 from discord import Embed
 from discord.ext.commands import Cog, group
 # from discord.ext.commands import has_permissions, MissingPermissions
 
 # Database
-from libs.database import Database as DB
+from libs.database import get_database, parse_fauna_time
+from libs.poll_votes import VoteAggregator
+from libs.render_scheduler import RenderScheduler
+from libs.reminder_core import get_scheduler, resume_scheduler
 
 # ///---- Log ----///
 log = logging.getLogger(__name__)
@@ -26,15 +30,268 @@ class Polls(Cog):
         '''
         __init__ del bot (importa este codigo como modulo al bot)
         '''
-        secret = os.getenv("FAUNADB_SECRET_KEY")
         self.bot = bot
-        self.db = DB(secret)
+        self.db = get_database()
+        # Los votos se acumulan en memoria y se escriben cada N segundos
+        self.sched = get_scheduler()
+        self.votes = VoteAggregator(
+            self.db, interval=float(os.getenv("POLL_FLUSH_INTERVAL", "5")))
+        # Como máximo una edición del embed por ventana y por encuesta
+        self.renders = RenderScheduler(
+            window=float(os.getenv("POLL_EDIT_WINDOW", "2")))
+        # Peso del voto por rol para las encuestas ponderadas: "role_id:peso,..."
+        self.role_weights = {}
+        for item in filter(None, os.getenv("POLL_ROLE_WEIGHTS", "").split(",")):
+            role_id, weight = item.split(":")
+            self.role_weights[int(role_id)] = int(weight)
+        # Si el módulo se carga con el bot ya conectado no llega el on_ready
+        if bot.is_ready():
+            bot.loop.create_task(self._startup())
+
+    def cog_unload(self):
+        # Los cierres automáticos y las ediciones apuntan a esta instancia,
+        # la nueva los vuelve a programar al cargarse
+        for job in self.sched.get_jobs(jobstore='memory'):
+            if job.id.startswith("poll-close-"):
+                job.remove()
+        self.renders.stop()
+        # Escribo los votos pendientes antes de descargar el módulo
+        self.bot.loop.create_task(self.votes.stop())
+
+    async def shutdown(self):
+        # Al cerrar el bot se espera a que se escriban los votos pendientes
+        await self.votes.stop()
 
     @staticmethod
     def colour():
         # return Colour.from_rgb(0, 235, 188).value
         return 0x00ebbc
 
+    emoji_number_list = ["1️⃣", "2️⃣", "3️⃣", "4️⃣",
+                         "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", "🔟"]
+
+    poll_labels = {
+        "normal": "voto único",
+        "custom": "voto único",
+        "multi": "voto múltiple",
+        "ranked": "ranking, reacciona en orden de preferencia",
+        "weighted": "voto único, ponderado por rol",
+    }
+
+    def _weight(self, member):
+        '''
+        Obtengo el peso del voto de un miembro según sus roles
+        '''
+        if member is None:
+            return 1
+        return max([self.role_weights.get(role.id, 1) for role in member.roles] + [1])
+
+    def _option(self, poll, emoji):
+        '''
+        Obtengo la opción de la encuesta que corresponde al emoji
+        '''
+        if poll.type == "normal":
+            return {'✅': 'Si', '❎': 'No'}.get(emoji)
+        if emoji in self.emoji_number_list:
+            idx = self.emoji_number_list.index(emoji)
+            options = list(poll.votes)
+            if idx < len(options):
+                return options[idx]
+        return None
+
+    def _poll_embed(self, poll):
+        '''
+        Genero el embed de una encuesta activa con el conteo actual
+        '''
+        votes = poll.votes
+        pollEmbed = Embed(
+            title=f":clipboard: {poll.question}", color=self.colour())
+        pollEmbed.set_thumbnail(
+            url="https://res.cloudinary.com/sebasec/image/upload/v1614807768/Fec_with_Shadow_jq8ll8.png")
+        pollEmbed.set_author(name="Encuesta")
+        pollEmbed.set_footer(text=poll.author, icon_url=poll.avatar_url)
+        if poll.type == "normal":
+            pollEmbed.add_field(
+                name="\u200b", value=f"**Opciones (voto único):**\n:white_check_mark: Sí: {votes['Si']} \n:negative_squared_cross_mark: No: {votes['No']}", inline=False)
+        else:
+            poll_text = ""
+            for idx, (answer, count) in enumerate(votes.items()):
+                poll_text += (
+                    f"\n{self.emoji_number_list[idx]} {answer}: {count}")
+            pollEmbed.add_field(
+                name=f"**Opciones ({self.poll_labels[poll.type]}):**", value=poll_text, inline=False)
+        return pollEmbed
+
+    @staticmethod
+    def _split_deadline(args):
+        '''
+        Separo el argumento opcional de cierre automático: cierre=<N>m|h|d
+        '''
+        units = {"m": "minutes", "h": "hours", "d": "days"}
+        deadline = None
+        options = []
+        for arg in args:
+            match = re.fullmatch(r"cierre=(\d+)([mhd])", arg)
+            if match:
+                delta = timedelta(**{units[match.group(2)]: int(match.group(1))})
+                deadline = datetime.now(timezone.utc) + delta
+            else:
+                options.append(arg)
+        return tuple(options), deadline
+
+    def _schedule_close(self, poll_id, channel_id, deadline):
+        '''
+        Programo el cierre automático de una encuesta
+        '''
+        # Si la fecha ya pasó (por ejemplo, el bot estuvo apagado) cierro ahora
+        run_date = max(deadline, datetime.now(timezone.utc))
+        self.sched.add_job(
+            self._auto_close,
+            'date',
+            run_date=run_date,
+            args=[poll_id, channel_id],
+            id=f"poll-close-{poll_id}",
+            replace_existing=True,
+            # Se vuelven a programar desde la base de datos al iniciar
+            jobstore='memory'
+        )
+
+    async def _db_create(self, id, poll_type, author, avatar, question, votes, channel_id, deadline=None):
+        '''
+        Guardo la encuesta en la DB y la registro en memoria
+        '''
+        data = {
+            "id": id,
+            "type": poll_type,
+            "author": str(author),
+            "avatar_url": str(avatar),
+            "question": question,
+            "is_active": True,
+            "votes_count": votes,
+            "channel_id": channel_id
+        }
+        if deadline is not None:
+            data["closes_at"] = self.db.q.time(deadline.isoformat())
+        poll = await self.db.create('Polls', data)
+        self.votes.add(poll['ref'], data)
+        if deadline is not None:
+            self._schedule_close(id, channel_id, deadline)
+
+    async def _close_poll(self, poll_id):
+        '''
+        Cierro una encuesta, guardo el resultado final y la quito de memoria.
+        Devuelvo el embed con los resultados, o None si no estaba activa.
+        '''
+        emoji_number_list = self.emoji_number_list
+        poll = await self.votes.get(poll_id)
+        if poll is None or not poll.is_active:
+            return None
+        # Antes del primer await, así un cierre simultáneo (manual o por
+        # deadline) no pasa la verificación anterior
+        poll.is_active = False
+
+        # Escribo los votos pendientes y quito la encuesta de memoria
+        await self.votes.close(poll_id)
+        self.renders.cancel(poll_id)
+        if self.sched.get_job(f"poll-close-{poll_id}"):
+            self.sched.remove_job(f"poll-close-{poll_id}")
+        log.info("Poll renders: %s", self.renders.stats())
+
+        results = poll.results()
+        winner = None
+        if poll.type == "ranked":
+            winner, rounds = poll.runoff()
+        closed = await self.db.close_poll(poll.ref, {
+            "poll_id": poll.id,
+            "type": poll.type,
+            "question": poll.question,
+            "results": [list(result) for result in results],
+            "winner": winner,
+            "voters": len(poll.voters)
+        })
+        # Otra instancia ya la había cerrado
+        if closed is None:
+            return None
+
+        # Send finish message
+        pollEmbed = Embed(
+            title=f":clipboard: {poll.question}", color=self.colour())
+        pollEmbed.set_thumbnail(
+            url="https://res.cloudinary.com/sebasec/image/upload/v1614807768/Fec_with_Shadow_jq8ll8.png")
+        pollEmbed.set_author(name="Encuesta Finalizada")
+        pollEmbed.set_footer(
+            text=poll.author, icon_url=poll.avatar_url)
+
+        poll_text = ""
+        # Sort votes by greater to lower
+        for idx, (k, v) in enumerate(results):
+            poll_text += (
+                f"\n{emoji_number_list[idx]} {k}: {v}")
+        if winner is not None:
+            poll_text += f"\n\n:trophy: **{winner}** (rondas: {len(rounds)})"
+        pollEmbed.add_field(
+            name="\u200b", value=f"**Votos:**{poll_text}", inline=False)
+        return pollEmbed
+
+    async def _auto_close(self, poll_id, channel_id):
+        try:
+            embed = await self._close_poll(poll_id)
+            if embed is not None:
+                channel = self.bot.get_channel(channel_id)
+                await channel.send(embed=embed)
+        except Exception as e:
+            log.error("Error closing poll %s: %s", poll_id, e)
+
+    async def _add_options_poll(self, ctx, poll_type, question, args, deadline=None):
+        '''
+        Creo una encuesta con respuestas personalizadas (máximo 10 respuestas)
+        '''
+        # Verifies if the amount of answers provided are more than 1 and equal or less than 10
+        if not ((len(args) > 1) and (len(args) <= 10)):
+            await ctx.channel.send("❌Cantidad de respuestas no válidas (mínimo 2 respuestas | máximo 10 respuestas)", delete_after=15)
+            return None
+
+        # Embed message
+        pollEmbed = Embed(
+            title=(f":clipboard: {question}"), color=self.colour())
+        pollEmbed.set_thumbnail(
+            url="https://res.cloudinary.com/sebasec/image/upload/v1614807768/Fec_with_Shadow_jq8ll8.png")
+        pollEmbed.set_author(name="Encuesta")
+        pollEmbed.set_footer(
+            text=ctx.author, icon_url=ctx.author.avatar_url)
+
+        # Format and add answers to embed
+        poll_text = ""
+        for idx, answer in enumerate(args):
+            poll_text += (
+                f"\n{self.emoji_number_list[idx]} {answer}: 0")
+
+        pollEmbed.add_field(
+            name=f"**Opciones ({self.poll_labels[poll_type]}):**", value=poll_text, inline=False)
+
+        # Dict of answers for DB
+        votes_count = {}
+        for answer in args:
+            votes_count[answer] = 0
+
+        # Send poll message to discord
+        msg = await ctx.channel.send(embed=pollEmbed)
+
+        # Add poll to database
+        await self._db_create(msg.id, poll_type, ctx.author,
+                              ctx.author.avatar_url, question, votes_count,
+                              ctx.channel.id, deadline)
+
+        # Add BOT reactions
+        for i in range(len(args)):
+            await msg.add_reaction(self.emoji_number_list[i])
+        return msg
+
+    async def _send_close_help(self, ctx, question, msg):
+        PREFIX = os.getenv("DISCORD_PREFIX")
+        user = self.bot.get_user(ctx.author.id)
+        await user.send(f"Para cerrar la votación de la encuesta '{question}' usar el siguiente comando: \n``` {PREFIX}poll close {msg.id} ```")
+
     #! poll
     #! Comando poll
     @group()
@@ -61,6 +318,9 @@ class Polls(Cog):
 
 - {PREFIX}poll help: Muestra la ayuda.
 - {PREFIX}poll add: Agregar encuesta.
+- {PREFIX}poll multi: Agregar encuesta de voto múltiple.
+- {PREFIX}poll ranked: Agregar encuesta por ranking (se reacciona en orden de preferencia).
+- {PREFIX}poll weighted: Agregar encuesta con voto ponderado por rol.
 - {PREFIX}poll close: Finalizar encuesta.
 
 Ejemplos:
@@ -70,6 +330,12 @@ Ejemplos:
 {PREFIX}poll add "Pregunta" "Opción 1" "Opción 2" "Opción 3" (Encuesta personalizada, máximo 10 respuestas)
 {PREFIX}poll add "¿Participas de alguno de los grupos de estudio, cuál?" "Python-Study-Group" "JS-Study-Group" "PHP-Study-Group" "Algorithms-Group"
 
+{PREFIX}poll multi "Pregunta" "Opción 1" "Opción 2" "Opción 3" (Se pueden elegir varias opciones)
+{PREFIX}poll ranked "Pregunta" "Opción 1" "Opción 2" "Opción 3" (Gana por mayoría con segunda vuelta instantánea)
+{PREFIX}poll weighted "Pregunta" "Opción 1" "Opción 2" (El voto vale según el rol)
+
+{PREFIX}poll add "Pregunta" "Opción 1" "Opción 2" cierre=2h (Se cierra sola luego de 2 horas, también acepta m y d)
+
 {PREFIX}poll close ID
 {PREFIX}poll close 123456789654687651233
 ```
@@ -84,30 +350,19 @@ Ejemplos:
         Agregar poll
         '''
 
-        def db_create(self, id, poll_type, author, avatar, question, votes):
-            self.db.create('Polls', {
-                "id": id,
-                "type": poll_type,
-                "author": str(author),
-                "avatar_url": str(avatar),
-                "question": question,
-                "is_active": True,
-                "users_voted": [],
-                "votes_count": votes
-            })
-        PREFIX = os.getenv("DISCORD_PREFIX")
+        args, deadline = self._split_deadline(args)
         try:
             await ctx.message.delete()
-            # Embed message
-            pollEmbed = Embed(
-                title=(f":clipboard: {question}"), color=self.colour())
-            pollEmbed.set_thumbnail(
-                url="https://res.cloudinary.com/sebasec/image/upload/v1614807768/Fec_with_Shadow_jq8ll8.png")
-            pollEmbed.set_author(name="Encuesta")
-            pollEmbed.set_footer(
-                text=ctx.author, icon_url=ctx.author.avatar_url)
             # Verifies if no answers were provided, and creates a yes/no poll
             if not args:
+                # Embed message
+                pollEmbed = Embed(
+                    title=(f":clipboard: {question}"), color=self.colour())
+                pollEmbed.set_thumbnail(
+                    url="https://res.cloudinary.com/sebasec/image/upload/v1614807768/Fec_with_Shadow_jq8ll8.png")
+                pollEmbed.set_author(name="Encuesta")
+                pollEmbed.set_footer(
+                    text=ctx.author, icon_url=ctx.author.avatar_url)
                 pollEmbed.add_field(
                     name="\u200b", value="**Opciones (voto único):**\n✅ Sí: 0  \n❎ No: 0", inline=False)
                 msg = await ctx.channel.send(embed=pollEmbed)
@@ -117,52 +372,54 @@ Ejemplos:
                 }
 
                 # Add poll to database
-                db_create(self, msg.id, "normal", ctx.author,
-                          ctx.author.avatar_url, question, votes_count)
+                await self._db_create(msg.id, "normal", ctx.author,
+                                      ctx.author.avatar_url, question, votes_count,
+                                      ctx.channel.id, deadline)
 
                 # Add BOT reactions
                 emojis = ['✅', '❎']
                 for emoji in emojis:
                     await msg.add_reaction(emoji)
-            # Verifies if the amount of answers provided are more than 1 and equal or less than 10
-            elif (len(args) > 1) and (len(args) <= 10):
-                emoji_number_list = ["1️⃣", "2️⃣", "3️⃣", "4️⃣",
-                                     "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", "🔟"]
-                try:
-                    # Format and add answers to embed
-                    poll_text = ""
-                    for idx, answer in enumerate(args):
-                        poll_text += (
-                            f"\n{emoji_number_list[idx]} {answer}: 0")
-
-                    pollEmbed.add_field(
-                        name="**Opciones (voto único):**", value=poll_text, inline=False)
-
-                    # Dict of answers for DB
-                    votes_count = {}
-                    for answer in args:
-                        votes_count[answer] = 0
-
-                    # Send poll message to discord
-                    msg = await ctx.channel.send(embed=pollEmbed)
-
-                    # Add poll to database
-                    db_create(self, msg.id, "custom", ctx.author,
-                              ctx.author.avatar_url, question, votes_count)
-
-                    # Add BOT reactions
-                    for i in range(len(args)):
-                        await msg.add_reaction(emoji_number_list[i])
-                except Exception as e:
-                    print(e)
             else:
-                await ctx.channel.send("❌Cantidad de respuestas no válidas (mínimo 2 respuestas | máximo 10 respuestas)", delete_after=15)
+                msg = await self._add_options_poll(ctx, "custom", question, args, deadline)
 
-            user = self.bot.get_user(ctx.author.id)
-            await user.send(f"Para cerrar la votación de la encuesta '{question}' usar el siguiente comando: \n``` {PREFIX}poll close {msg.id} ```")
+            if msg is not None:
+                await self._send_close_help(ctx, question, msg)
         except Exception as e:
             print(e)
 
+    #! Subcomandos multi, ranked y weighted
+    @poll.command()
+    async def multi(self, ctx, question, *args):
+        '''
+        Agregar poll de voto múltiple
+        '''
+        await self._add_typed_poll(ctx, "multi", question, args)
+
+    @poll.command()
+    async def ranked(self, ctx, question, *args):
+        '''
+        Agregar poll por ranking (instant runoff)
+        '''
+        await self._add_typed_poll(ctx, "ranked", question, args)
+
+    @poll.command()
+    async def weighted(self, ctx, question, *args):
+        '''
+        Agregar poll con voto ponderado por rol
+        '''
+        await self._add_typed_poll(ctx, "weighted", question, args)
+
+    async def _add_typed_poll(self, ctx, poll_type, question, args):
+        args, deadline = self._split_deadline(args)
+        try:
+            await ctx.message.delete()
+            msg = await self._add_options_poll(ctx, poll_type, question, args, deadline)
+            if msg is not None:
+                await self._send_close_help(ctx, question, msg)
+        except Exception as e:
+            log.error("Error creating %s poll: %s", poll_type, e)
+
     # @add.error
     # async def add_error(self, ctx, error):
     #     if isinstance(error, MissingPermissions):
@@ -172,34 +429,12 @@ Ejemplos:
     @poll.command()
     # @has_permissions(manage_messages=False)
     async def close(self, ctx, poll_id):
-        emoji_number_list = ["1️⃣", "2️⃣", "3️⃣", "4️⃣",
-                             "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", "🔟"]
         try:
-            poll = self.db.get_poll_by_discord_id(int(poll_id))
-            votes = poll['data']['votes_count']
-            self.db.update_with_ref(
-                poll['ref'],
-                {
-                    "is_active": False,
-                }
-            )
-            # Send finish message
-            pollEmbed = Embed(
-                title=f":clipboard: {poll['data']['question']}", color=self.colour())
-            pollEmbed.set_thumbnail(
-                url="https://res.cloudinary.com/sebasec/image/upload/v1614807768/Fec_with_Shadow_jq8ll8.png")
-            pollEmbed.set_author(name="Encuesta Finalizada")
-            pollEmbed.set_footer(
-                text=poll['data']['author'], icon_url=poll['data']['avatar_url'])
-
-            poll_text = ""
-            # Sort votes by greater to lower
-            for idx, (k, v) in enumerate(sorted(votes.items(), key=lambda vote: vote[1], reverse=True)):
-                poll_text += (
-                    f"\n{emoji_number_list[idx]} {k}: {v}")
-            pollEmbed.add_field(
-                name="\u200b", value=f"**Votos:**{poll_text}", inline=False)
+            pollEmbed = await self._close_poll(int(poll_id))
             await ctx.message.delete()
+            if pollEmbed is None:
+                await ctx.channel.send("❌La encuesta no existe o ya fue finalizada", delete_after=15)
+                return
             await ctx.channel.send(embed=pollEmbed)
         except Exception as e:
             print(e)
@@ -210,102 +445,81 @@ Ejemplos:
     #         await ctx.message.delete()
     #         await ctx.channel.send("No tienes permiso para cerrar encuestas :slight_frown:", delete_after=15)
 
+    @Cog.listener()
+    async def on_ready(self):
+        await self._startup()
+
+    async def _startup(self):
+        # Cargo el índice de encuestas activas
+        try:
+            await self.votes.load_active()
+        except Exception as e:
+            log.error("Error loading active polls: %s", e)
+        # Vuelvo a programar los cierres automáticos
+        try:
+            async for closes_at, poll_id, channel_id in self.db.iter_poll_deadlines():
+                if closes_at is None:
+                    continue
+                # Un cierre que no se puede programar no frena a los demás
+                try:
+                    self._schedule_close(poll_id, channel_id, parse_fauna_time(closes_at))
+                except Exception as e:
+                    log.error("Error scheduling poll %s deadline: %s", poll_id, e)
+        except Exception as e:
+            log.error("Error scheduling poll deadlines: %s", e)
+        resume_scheduler()
+
     # On poll reaction:
     @Cog.listener()
     async def on_raw_reaction_add(self, payload):
-        # Obtain reacted message by id
+        # Check if the reaction was added by the bot
+        if payload.user_id == self.bot.user.id:
+            return
+        # Check if reacted message is an active poll, without network I/O
+        if not self.votes.is_active(payload.message_id):
+            return
+        # Las reacciones a encuestas finalizadas se ignoran sin avisar: ya no se
+        # consulta la DB por cada reacción para saber si el mensaje fue una encuesta
+        try:
+            poll = await self.votes.get(payload.message_id)
+            if poll is None or not poll.is_active:
+                return
+            option = self._option(poll, payload.emoji.name)
+            if option is None:
+                return
+            weight = self._weight(payload.member) if poll.type == "weighted" else 1
+            if self.votes.vote(poll, payload.user_id, option, weight):
+                self._render(poll, payload)
+            elif poll.single_vote and poll.has_voted(payload.user_id):
+                # Send DM if the user has voted
+                user = self.bot.get_user(payload.user_id)
+                await user.send(f"Ya has votado en la encuesta '{poll.question}'")
+        except Exception as e:
+            print(e)
+
+    # On poll reaction removed (multi, ranked and weighted polls):
+    @Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        if payload.user_id == self.bot.user.id:
+            return
+        if not self.votes.is_active(payload.message_id):
+            return
+        try:
+            poll = await self.votes.get(payload.message_id)
+            if poll is None or not poll.is_active:
+                return
+            option = self._option(poll, payload.emoji.name)
+            if option is not None and self.votes.unvote(poll, payload.user_id, option):
+                self._render(poll, payload)
+        except Exception as e:
+            log.error("Error removing vote from poll %s: %s", payload.message_id, e)
+
+    def _render(self, poll, payload):
+        # Edit message
         channel = self.bot.get_channel(payload.channel_id)
-        msg = await channel.fetch_message(payload.message_id)
-        # Check if reacted message was sended by the bot
-        colour = msg.embeds[0].colour if len(msg.embeds) == 1 else Embed.Empty
-        if colour != Embed.Empty:
-            colour = colour.value
-        if msg.author == self.bot.user and colour == self.colour():
-            # Check if the reaction was added by the bot
-            if (payload.user_id != self.bot.user.id):
-                # Search poll in DB
-                try:
-                    poll = self.db.get_poll_by_discord_id(payload.message_id)
-                    ref = poll['ref']
-                    is_active = poll['data']['is_active']
-                    p_type = poll['data']['type']
-                    users = poll['data']['users_voted']
-                    votes = poll['data']['votes_count']
-                    # Check if poll is "active"
-                    if is_active:
-                       # Check if user has voted
-                        if (payload.user_id not in users):
-                            users.append(payload.user_id)
-                            # Check if poll type is "normal" (yes/no poll)
-                            if (p_type == "normal"):
-                                if(payload.emoji.name == '✅'):
-                                    votes['Si'] += 1
-                                elif(payload.emoji.name == '❎'):
-                                    votes['No'] += 1
-
-                                # Update users and votes to DB
-                                try:
-                                    self.db.update_with_ref(
-                                        ref,
-                                        {
-                                            "users_voted": users,
-                                            "votes_count": votes
-                                        }
-                                    )
-                                except Exception as e:
-                                    print(e)
-                                # Edit message
-                                pollEmbed = Embed(
-                                    title=f":clipboard: {poll['data']['question']}", color=self.colour())
-                                pollEmbed.set_thumbnail(
-                                    url="https://res.cloudinary.com/sebasec/image/upload/v1614807768/Fec_with_Shadow_jq8ll8.png")
-                                pollEmbed.set_author(name="Encuesta")
-                                pollEmbed.set_footer(
-                                    text=poll['data']['author'], icon_url=poll['data']['avatar_url'])
-                                pollEmbed.add_field(
-                                    name="\u200b", value=f"**Opciones (voto único):**\n:white_check_mark: Sí: {votes['Si']} \n:negative_squared_cross_mark: No: {votes['No']}", inline=False)
-                                await msg.edit(embed=pollEmbed)
-                            # Check if poll type is "custom" (personalized answers poll)
-                            elif (p_type == "custom"):
-                                emoji_number_list = ["1️⃣", "2️⃣", "3️⃣", "4️⃣",
-                                                     "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", "🔟"]
-                                for idx, emoji in enumerate(emoji_number_list):
-                                    if (emoji == payload.emoji.name):
-                                        listVotes = list(votes)
-                                        votes[listVotes[idx]] += 1
-                                        # Update users and votes to DB
-                                        try:
-                                            self.db.update_with_ref(
-                                                ref,
-                                                {
-                                                    "users_voted": users,
-                                                    "votes_count": votes
-                                                }
-                                            )
-                                            pollEmbed = Embed(
-                                                title=f":clipboard: {poll['data']['question']}", color=self.colour())
-                                            pollEmbed.set_thumbnail(
-                                                url="https://res.cloudinary.com/sebasec/image/upload/v1614807768/Fec_with_Shadow_jq8ll8.png")
-                                            pollEmbed.set_author(
-                                                name="Encuesta")
-                                            pollEmbed.set_footer(
-                                                text=poll['data']['author'], icon_url=poll['data']['avatar_url'])
-                                            poll_text = ""
-                                            for idx, answer in enumerate(votes):
-                                                poll_text += (
-                                                    f"\n{emoji_number_list[idx]} {answer}: {votes[listVotes[idx]]}")
-                                            pollEmbed.add_field(
-                                                name="**Opciones (voto único):**", value=poll_text, inline=False)
-                                            await msg.edit(embed=pollEmbed)
-                                        except Exception as e:
-                                            print(e)
-                        else:
-                            # Send DM if the user has voted
-                            user = self.bot.get_user(payload.user_id)
-                            await user.send(f"Ya has votado en la encuesta '{poll['data']['question']}'")
-                    else:
-                        # Send DM if the poll has finished
-                        user = self.bot.get_user(payload.user_id)
-                        await user.send(f"La votación de la encuesta '{poll['data']['question']}' ha finalizado")
-                except Exception as e:
-                    print(e)
+        msg = channel.get_partial_message(payload.message_id)
+        self.renders.request(msg, lambda: self._poll_embed(poll))
+
+
+def setup(bot):
+    bot.add_cog(Polls(bot))
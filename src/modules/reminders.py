@@ -6,13 +6,13 @@ import logging
 from enum import Enum
 from datetime import datetime, timedelta
 
-import dateparser
 from discord import Embed, Colour
 from discord.ext import commands
 import zoneinfo
 
 from libs.reminder_core import ReminderCore
-from libs.database import Database as DB
+from libs.database import get_database
+from libs import datetime_parser
 from libs.embed import EmbedGenerator
 from scripts.embeds_reminder import *
 
@@ -58,7 +58,6 @@ class Reminders(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        secret = os.getenv("FAUNADB_SECRET_KEY")
         self.PREFIX = os.getenv("DISCORD_PREFIX")
         self.add_reminder = {
             "title": '',
@@ -72,8 +71,7 @@ class Reminders(commands.Cog):
             "author_id": ""
         }
 
-        if secret != None:
-            self.db = DB(secret)
+        self.db = get_database()
         self._reminder = ReminderCore(self.db)
 
         # Nombre de la colección de la DB
@@ -87,10 +85,13 @@ class Reminders(commands.Cog):
         }
         # Defino la función que se utiliza para ejecutar los eventos
         self._reminder.action = self.action
+        # Si el módulo se carga con el bot ya conectado no llega el on_ready
+        if bot.is_ready():
+            bot.loop.create_task(self._startup())
 
     @staticmethod
     def _process_date_time(date, time):
-        date_time = dateparser.parse(f'le {date} {time} -03:00')
+        date_time = datetime_parser.parse(f'le {date} {time} -03:00')
         tz = zoneinfo.ZoneInfo('America/Buenos_Aires')
         date_time_now = datetime.now(tz)
         if date_time is None:
@@ -173,18 +174,18 @@ class Reminders(commands.Cog):
         embed = e.generate_embed()
         channel = self.bot.get_channel(int(channel_id))
         await channel.send(f"{msg}! <:fecimpostor:755971090471321651>", embed=embed)
-        await self.on_ready()  # Obtengo los recordatorios que están programados
 
     # Comandos del bot
 
     @commands.Cog.listener()
     async def on_ready(self):
+        await self._startup()
+
+    async def _startup(self):
         """
-        Cuando el bot se conecta a Discord, remuevo todos los recordatorios de la VM
-        y evitar duplicados. Luego cargo los recordatorios de la DB.
+        Cuando el bot se conecta a Discord cargo los recordatorios de la DB,
+        `load` se encarga de eliminar los vencidos.
         """
-        log.info("Deleting all old reminders from DB")
-        await self._reminder._remove_old_event()
         log.info("Retrieving reminders from database...")
         await self._reminder.load()
 
@@ -235,7 +236,7 @@ class Reminders(commands.Cog):
             rem_date, rem_time = await date_reminder(ctx, self.bot, self._process_date_time, self.colour)
             self.add_reminder["date"] = rem_date
             self.add_reminder["time"] = rem_time
-            date_time = dateparser.parse(
+            date_time = datetime_parser.parse(
                 f'le {self.add_reminder["date"]} {self.add_reminder["time"]} -03:00')
 
         # Paso 7-cron-a: Día de la semana y hora del recordatorio
@@ -318,7 +319,7 @@ siguiente manera:
 
             doc = {}
             if self.add_reminder["type"] == "date":
-                date_time = dateparser.parse(
+                date_time = datetime_parser.parse(
                     f'le {self.add_reminder["date"]} {self.add_reminder["time"]} -03:00')
                 if date_time == None:
                     return
@@ -448,3 +449,7 @@ siguiente manera:
         ]
         embed = h.generate_embed()
         return await ctx.send(embed=embed, delete_after=60)
+
+
+def setup(bot):
+    bot.add_cog(Reminders(bot))
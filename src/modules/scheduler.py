@@ -6,11 +6,12 @@ import logging
 import asyncio
 from datetime import datetime, timezone, timedelta
 
-import dateparser
 from discord import Embed, Colour
 from discord.ext import commands
 
 from libs.reminder import Reminder
+from libs.database import get_database
+from libs import datetime_parser
 
 from enum import Enum
 
@@ -45,10 +46,7 @@ class Scheduler(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        secret = os.getenv("FAUNADB_SECRET_KEY")
-
-
-        self.reminder = Reminder(secret)
+        self.reminder = Reminder(get_database())
 
         # Nombre de la colección de la DB
         self.reminder.collection = "Events"
@@ -72,6 +70,13 @@ class Scheduler(commands.Cog):
             'CANCEL': "\N{NO ENTRY SIGN}"
         }
 
+        # Ids de los mensajes de confirmación que esperan una reacción
+        self.confirmations = set()
+
+        # Si el módulo se carga con el bot ya conectado no llega el on_ready
+        if bot.is_ready():
+            bot.loop.create_task(self._startup())
+
 
     @staticmethod
     def colour():
@@ -93,7 +98,7 @@ class Scheduler(commands.Cog):
 
     @staticmethod
     def _process_date_time(date_time):
-        date_time = dateparser.parse(date_time)
+        date_time = datetime_parser.parse(date_time)
         date_time_now = datetime.utcnow().replace(tzinfo=timezone.utc)
         if date_time is None:
             return Error.DATETIME
@@ -174,6 +179,9 @@ class Scheduler(commands.Cog):
 
     @commands.Cog.listener()
     async def on_ready(self):
+        await self._startup()
+
+    async def _startup(self):
         log.info("Scheduler is on")
         await self.reminder.load()
 
@@ -262,6 +270,8 @@ class Scheduler(commands.Cog):
         embed.set_footer(text="Los datos son correctos?")
 
         msg = await ctx.send(embed=embed, delete_after=60)
+        self.confirmations.add(msg.id)
+        self.bot.loop.call_later(60, self.confirmations.discard, msg.id)
         await msg.add_reaction(self.emoji['CANCEL'])
         await msg.add_reaction(self.emoji['OK'])
 
@@ -377,6 +387,9 @@ class Scheduler(commands.Cog):
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload):
+        # Solo me interesan los mensajes de confirmación pendientes
+        if payload.message_id not in self.confirmations:
+            return
         # Obtain reactioned message by id
         channel = self.bot.get_channel(payload.channel_id)
         msg = await channel.fetch_message(payload.message_id)
@@ -403,6 +416,7 @@ class Scheduler(commands.Cog):
                     PREFIX = os.getenv("DISCORD_PREFIX")
 
                     doc = await self.reminder.add(author, date_time, str(channel_id), content)
+                    self.confirmations.discard(msg.id)
                     await msg.delete()
                     embed = Embed(
                         title="Evento agregado con exito!",
@@ -413,6 +427,11 @@ class Scheduler(commands.Cog):
                     return await channel.send(embed=embed, delete_after=60)
 
                 if payload.emoji.name == self.emoji['CANCEL']:
+                    self.confirmations.discard(msg.id)
                     await msg.delete()
                     embed = Embed(title="Evento cancelado", color=self.colour())
                     return await channel.send(embed=embed, delete_after=60)
+
+
+def setup(bot):
+    bot.add_cog(Scheduler(bot))
@@ -1,12 +1,13 @@
 # -*- coding: utf-8 -*-
 
 import logging
-import requests
-import urllib.parse as parse
 
 import discord
 from discord.ext import commands
-from bs4 import BeautifulSoup
+from discord.ext.commands.core import has_role
+from discord.ext.commands.errors import MissingRole
+
+from libs.web_search import get_search_service
 
 
 log = logging.getLogger(__name__)
@@ -15,8 +16,10 @@ log = logging.getLogger(__name__)
 class Search(commands.Cog):
     """Módulo para hacer busquedas en la web."""
 
+    admins_role_id = 645411178398351363
+
     def __init__(self, bot):
-        pass
+        self.service = get_search_service()
 
     @commands.command()
     async def search(self, ctx, *query):
@@ -29,8 +32,7 @@ class Search(commands.Cog):
         query = " ".join(query)
         log.info(f"Search: {query}")
 
-        search_engine = DuckDuckGoSearch()
-        data = await search_engine.search(query)
+        data = await self.service.search(query)
 
         # Mando un aviso si no obtengo resultados
         if not data:
@@ -47,33 +49,29 @@ class Search(commands.Cog):
 
         await ctx.send(embed=embed, delete_after=60)
 
+    @commands.command()
+    @has_role(admins_role_id)
+    async def searchstats(self, ctx):
+        """Comando searchstats
 
-class DuckDuckGoSearch:
-    def __init__(self):
-        self.url = "https://html.duckduckgo.com/html/?q="
-
-    async def search(self, query, num=5):
-        res = requests.get(self.url + "".join(query), headers={'user-agent': 'Mozilla/5.0'})
-        res.raise_for_status()
-        soup = BeautifulSoup(res.text, "html.parser")
-        elements = soup.find_all("div", attrs={"class": "result results_links results_links_deep web-result"})
-
-        result = []
-        for i, e in enumerate(elements):
-            if i > num:
-                break
-
-            try:
-                data = e.find("a", attrs={"class": "result__a"})
-                title = data.text.strip()
-                link = parse.unquote(data['href'].rsplit("//duckduckgo.com/l/?uddg=")[1])
+        Muestra la latencia de cada proveedor de búsqueda.
+        """
 
-                if title == "" or link == "":
-                    continue
+        lines = []
+        for name, stats in self.service.stats().items():
+            avg = f"{stats['avg'] * 1000:.0f}ms" if stats["avg"] is not None else "-"
+            buckets = " ".join(f"{label}:{count}" for label, count in stats["buckets"].items() if count)
+            lines.append(f"{name}: {stats['count']} ok, {stats['errors']} errores, "
+                         f"{stats['late']} fuera de tiempo, promedio {avg}\n  {buckets}")
+        await ctx.send("```\n" + "\n".join(lines) + "\n```", delete_after=60)
 
-                result.append((title, link))
+    @searchstats.error
+    async def searchstats_error(self, ctx, error):
+        if isinstance(error, MissingRole):
+            await ctx.channel.send("Solo Admins puede ejecutar este comando", delete_after=30)
+        else:
+            raise error
 
-            except:
-                continue
 
-        return result
+def setup(bot):
+    bot.add_cog(Search(bot))
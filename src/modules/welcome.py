@@ -1,11 +1,36 @@
 # Modulo welcome.py
 
+import os
+import random
+import asyncio
+import logging
+
+import discord
 from discord.ext import commands
 
+from libs.ratelimit import TokenBucket, RateDetector
+
+log = logging.getLogger(__name__)
+
+WELCOME_MESSAGE = '''Hola, te damos la bienvenida a FrontendCafé!!
+        \nSomos una comunidad de personas interesadas en tecnología y ciencias informáticas. Conversamos sobre lenguajes de programación, diseño web, infraestructura, compartimos dudas y tratamos de resolverlas en conjunto.\nAdemás, nos organizamos en grupos para estudiar, hacer proyectos en equipo y practicar en inglés para perfeccionarnos.\nTenemos un espacio de coworking, también nos vamos de after office y jugamos jueguitos!
+        \nAquí abajo dejamos información que **es necesaria que revises antes de comenzar a participar**, ya que es muy importante que contribuyamos a mantener este server como un espacio seguro, amigable y divertido para cualquier persona que participe.
+        \n* Código de conducta <#748183026244255824>\n* Manual de uso <#747925827265495111>
+        \nPor favor, al hacer una consulta dentro del server, intenta incluir la mayor cantidad de datos posibles sobre qué estás intentando, qué errores encuentras y qué quieres lograr para que podamos ayudarte de la mejor manera posible. Si tienes dudas de dónde publicar la pregunta puedes consultar en <#594935077637718027> y te orientarán. Asimismo, puedes usar el buscador, situado arriba a la derecha, para verificar que tu pregunta no haya sido respondida anteriormente.
+        \nNos encantaría que pases por <#748547143157022871> y nos cuentes algo de ti :slight_smile:
+        \nSaludos!
+        \n*El Staff de FrontendCafé*'''
+
 
 class Welcome(commands.Cog):
     '''
     Saludo de bienvenida al server
+
+    Los DMs de bienvenida se encolan y se envían con un token bucket, así
+    una ola de ingresos no agota el rate limit de DMs del bot. Si la
+    cantidad de ingresos por minuto supera `storm_threshold`, se pasa a modo
+    degradado: no se mandan DMs y queda solo el saludo por lotes de
+    NewMembers en el canal.
     '''
 
     def __init__(self, bot):
@@ -13,15 +38,82 @@ class Welcome(commands.Cog):
         __init__ del bot (importa este codigo como modulo al bot)
         '''
         self.bot = bot
+        self.bucket = TokenBucket(
+            rate=float(os.getenv("WELCOME_DM_RATE", "1")),
+            capacity=int(os.getenv("WELCOME_DM_BURST", "5"))
+        )
+        self.concurrency = int(os.getenv("WELCOME_DM_WORKERS", "2"))
+        self.max_retries = int(os.getenv("WELCOME_DM_RETRIES", "3"))
+        self.storm_threshold = int(os.getenv("WELCOME_STORM_JOINS", "30"))
+        self.joins = RateDetector(window=60)
+        self.degraded = False
+        self.queue = asyncio.Queue(maxsize=1000)
+        self.workers = []
+
+    def cog_unload(self):
+        for worker in self.workers:
+            worker.cancel()
+
+    def _ensure_workers(self):
+        if not self.workers:
+            self.workers = [asyncio.ensure_future(self._worker())
+                            for _ in range(self.concurrency)]
+
+    def _check_storm(self):
+        '''
+        Entro en modo degradado al superar el umbral de ingresos por minuto y
+        salgo cuando baja a la mitad, para no oscilar en el límite
+        '''
+        joins = self.joins.count()
+        if not self.degraded and joins > self.storm_threshold:
+            self.degraded = True
+            log.warning("Join storm (%s joins/min): welcome DMs disabled", joins)
+        elif self.degraded and joins <= self.storm_threshold // 2:
+            self.degraded = False
+            log.info("Join storm finished: welcome DMs enabled")
+        return self.degraded
+
+    async def _worker(self):
+        while True:
+            member = await self.queue.get()
+            try:
+                await self._send(member)
+            except Exception as e:
+                log.error("Error sending welcome DM to %s: %s", member.id, e)
+            finally:
+                self.queue.task_done()
+
+    async def _send(self, member):
+        for attempt in range(self.max_retries + 1):
+            # Durante una ola de ingresos descarto lo que quedó en la cola
+            if self.degraded:
+                return
+            await self.bucket.acquire()
+            try:
+                await member.send(WELCOME_MESSAGE)
+                return
+            except discord.Forbidden:
+                # El usuario tiene los DMs cerrados
+                return
+            except discord.HTTPException as e:
+                if e.status != 429 or attempt == self.max_retries:
+                    raise
+                backoff = 2 ** attempt + random.uniform(0, 1)
+                log.warning("Welcome DM rate limited, retrying in %.1fs", backoff)
+                await asyncio.sleep(backoff)
 
     #! Comando
     @commands.Cog.listener()
     async def on_member_join(self, member):
-        await member.send('''Hola, te damos la bienvenida a FrontendCafé!!
-        \nSomos una comunidad de personas interesadas en tecnología y ciencias informáticas. Conversamos sobre lenguajes de programación, diseño web, infraestructura, compartimos dudas y tratamos de resolverlas en conjunto.\nAdemás, nos organizamos en grupos para estudiar, hacer proyectos en equipo y practicar en inglés para perfeccionarnos.\nTenemos un espacio de coworking, también nos vamos de after office y jugamos jueguitos!
-        \nAquí abajo dejamos información que **es necesaria que revises antes de comenzar a participar**, ya que es muy importante que contribuyamos a mantener este server como un espacio seguro, amigable y divertido para cualquier persona que participe.
-        \n* Código de conducta <#748183026244255824>\n* Manual de uso <#747925827265495111>
-        \nPor favor, al hacer una consulta dentro del server, intenta incluir la mayor cantidad de datos posibles sobre qué estás intentando, qué errores encuentras y qué quieres lograr para que podamos ayudarte de la mejor manera posible. Si tienes dudas de dónde publicar la pregunta puedes consultar en <#594935077637718027> y te orientarán. Asimismo, puedes usar el buscador, situado arriba a la derecha, para verificar que tu pregunta no haya sido respondida anteriormente.
-        \nNos encantaría que pases por <#748547143157022871> y nos cuentes algo de ti :slight_smile:
-        \nSaludos!
-        \n*El Staff de FrontendCafé*''')
+        self.joins.hit()
+        if self._check_storm():
+            return
+        self._ensure_workers()
+        try:
+            self.queue.put_nowait(member)
+        except asyncio.QueueFull:
+            log.warning("Welcome DM queue full, skipping %s", member.id)
+
+
+def setup(bot):
+    bot.add_cog(Welcome(bot))
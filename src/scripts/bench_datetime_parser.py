@@ -0,0 +1,58 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Benchmark: libs.datetime_parser vs dateparser
+#
+# Desde src/:
+#   python -m scripts.bench_datetime_parser [iteraciones]
+
+import sys
+import time
+import timeit
+from datetime import datetime, timezone
+
+from libs import datetime_parser
+
+PHRASES = [
+    "hoy a las 22:00 gmt-3",
+    "mañana a las 22:00 gmt-3",
+    "el 2030/12/24 a las 8pm gmt-3",
+    "le 24/12/2030 20:30 -03:00",
+    "el viernes a las 19hs gmt-3",
+    "en 2 horas gmt-3",
+    "tomorrow 8am utc",
+]
+
+
+def bench(name: str, func, number: int):
+    total = timeit.timeit(lambda: [func(phrase) for phrase in PHRASES], number=number)
+    per_call = total / (number * len(PHRASES)) * 1e6
+    print(f"{name:<30} {per_call:>10.1f} µs/frase")
+
+
+def uncached(phrase: str):
+    spec = datetime_parser.parse_spec.__wrapped__(phrase)
+    return datetime_parser._resolve(spec, datetime.now(timezone.utc))
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    started = time.perf_counter()
+    import dateparser
+    print(f"{'import dateparser':<30} {(time.perf_counter() - started) * 1e3:>10.1f} ms\n")
+
+    # Comparo los resultados de ambos
+    for phrase in PHRASES:
+        print(f"{phrase:<32} {datetime_parser.parse(phrase, fallback=False)!s:<28} "
+              f"{dateparser.parse(phrase)}")
+    print()
+
+    bench("dateparser.parse", dateparser.parse, number)
+    bench("datetime_parser (sin cache)", uncached, number)
+    bench("datetime_parser.parse", datetime_parser.parse, number)
+    print(datetime_parser.parse_spec.cache_info())
+
+
+if __name__ == "__main__":
+    main()
@@ -176,6 +176,108 @@ try:
 except:
     print("The `poll_by_discord_id` index already exists.")
 
+# Index para obtener los ids de discord de las encuestas activas
+try:
+    resp = client.query(
+        q.create_index(
+            {
+                "name": "active_polls",
+                "source": q.collection("Polls"),
+                "terms": [{"field": ["data", "is_active"]}],
+                "values": [{"field": ["data", "id"]}],
+            }
+        )
+    )
+    info_index(resp, "active_polls")
+
+except:
+    print("The `active_polls` index already exists.")
+
+# Index para obtener la fecha de cierre de las encuestas activas
+try:
+    resp = client.query(
+        q.create_index(
+            {
+                "name": "active_polls_by_deadline",
+                "source": q.collection("Polls"),
+                "terms": [{"field": ["data", "is_active"]}],
+                "values": [
+                    {"field": ["data", "closes_at"]},
+                    {"field": ["data", "id"]},
+                    {"field": ["data", "channel_id"]},
+                ],
+            }
+        )
+    )
+    info_index(resp, "active_polls_by_deadline")
+
+except:
+    print("The `active_polls_by_deadline` index already exists.")
+
+# Creo la colección de resultados finales de las encuestas
+try:
+    resp = client.query(
+        q.create_collection({
+            "name": "PollResults",
+        })
+    )
+    info_collection(resp, "PollResults")
+except:
+    print("The `PollResults` collection already exists.")
+
+# Creo la colección de votos de las encuestas
+try:
+    resp = client.query(
+        q.create_collection({
+            "name": "PollVotes",
+        })
+    )
+    info_collection(resp, "PollVotes")
+except:
+    print("The `PollVotes` collection already exists.")
+
+# Index para obtener los votos de una encuesta ordenados por llegada
+try:
+    resp = client.query(
+        q.create_index(
+            {
+                "name": "poll_ballots_by_poll",
+                "source": q.collection("PollVotes"),
+                "terms": [{"field": ["data", "poll_id"]}],
+                "values": [
+                    {"field": ["data", "seq"]},
+                    {"field": ["data", "user_id"]},
+                    {"field": ["data", "option"]},
+                    {"field": ["data", "weight"]},
+                ],
+            }
+        )
+    )
+    info_index(resp, "poll_ballots_by_poll")
+
+except:
+    print("The `poll_ballots_by_poll` index already exists.")
+
+# Index para buscar el voto de una persona por una opción
+try:
+    resp = client.query(
+        q.create_index(
+            {
+                "name": "poll_vote_by_ballot",
+                "source": q.collection("PollVotes"),
+                "terms": [
+                    {"field": ["data", "poll_id"]},
+                    {"field": ["data", "user_id"]},
+                    {"field": ["data", "option"]},
+                ],
+            }
+        )
+    )
+    info_index(resp, "poll_vote_by_ballot")
+
+except:
+    print("The `poll_vote_by_ballot` index already exists.")
+
 # Creo la colección de Mentorados con warnings
 try:
     resp = client.query(